@@ -0,0 +1,73 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from builtins import object
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+class AuthCache(object):
+    """Remembers users authenticated by Basic credentials, so the following requests carrying the
+    same Authorization header skip the password hasher. Entries are keyed by an HMAC of the header
+    (the credentials are never stored) and hold the user pk with a fingerprint of the password hash
+    and active flag: changing the password or deactivating the user invalidates them. Only users
+    authenticated by the Basic authenticator itself are stored. Entries expire after timeout
+    seconds, how many of them are kept meanwhile is up to the cache_alias backend."""
+
+    cache_alias = 'default'
+    timeout = 60
+    key_prefix = 'djangodav:auth:'
+
+    def __init__(self, **kwargs):
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_key(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not header.startswith('Basic '):
+            return None
+        return self.key_prefix + salted_hmac('djangodav.auth.cache', header).hexdigest()
+
+    def get_fingerprint(self, user):
+        return salted_hmac('djangodav.auth.cache.user', '%s:%s' % (user.password, user.is_active)).hexdigest()
+
+    def get(self, request):
+        """Return the cached user for the request credentials, None on a miss."""
+        key = self.get_key(request)
+        entry = key and self.cache.get(key)
+        if not entry:
+            return None
+        pk, fingerprint = entry
+        user = get_user_model()._default_manager.filter(pk=pk).first()
+        if user is None or not constant_time_compare(fingerprint, self.get_fingerprint(user)):
+            self.cache.delete(key)
+            return None
+        return user
+
+    def set(self, request, user):
+        key = self.get_key(request)
+        if key and user is not None and user.pk is not None:
+            self.cache.set(key, (user.pk, self.get_fingerprint(user)), self.timeout)
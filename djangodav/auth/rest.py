@@ -27,6 +27,7 @@ from djangodav.responses import HttpResponseUnAuthorized
 
 try:
     import rest_framework
+    from rest_framework.authentication import BasicAuthentication
     from rest_framework.exceptions import APIException
 except ImportError:
     rest_framework = None
@@ -42,15 +43,19 @@ class RequestWrapper(object):
     
 class RestAuthViewMixIn(object):
     authentications = NotImplemented
+    auth_cache = None  # djangodav.auth.cache.AuthCache instance to skip authenticators on repeated credentials
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
         assert rest_framework is not None, "django rest framework is not installed."
         if request.method.lower() != 'options':
             user_auth_tuple = None
-            for auth in self.authentications:
+            cached_user = self.auth_cache and self.auth_cache.get(request)
+            if cached_user is not None:
+                user_auth_tuple = (cached_user, None)
+            for authentication in self.authentications if user_auth_tuple is None else ():
                 try:
-                    user_auth_tuple = auth.authenticate(RequestWrapper(request))
+                    user_auth_tuple = authentication.authenticate(RequestWrapper(request))
                 except APIException as e:
                     return HttpResponse(e.detail, status=e.status_code)
                 else:
@@ -61,6 +66,8 @@ class RestAuthViewMixIn(object):
 
             if user_auth_tuple is not None:
                 user, auth = user_auth_tuple
+                if self.auth_cache and cached_user is None and isinstance(authentication, BasicAuthentication):
+                    self.auth_cache.set(request, user)
             else:
                 resp = HttpResponseUnAuthorized("Not Authorised")
                 resp['WWW-Authenticate'] = self.authentications[0].authenticate_header(request)
@@ -25,20 +25,35 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from djangodav.responses import HttpResponseUnAuthorized
 
+try:
+    from tastypie.authentication import BasicAuthentication
+except ImportError:
+    BasicAuthentication = None
+
 
 class TastypieAuthViewMixIn(object):
     authentication = NotImplemented
+    auth_cache = None  # djangodav.auth.cache.AuthCache instance to skip authentication on repeated credentials
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
 
         if request.method.lower() != 'options':
-            auth_result = self.authentication.is_authenticated(request)
+            cached_user = self.auth_cache and self.auth_cache.get(request)
+            if cached_user is not None:
+                request.user = cached_user
+            else:
+                auth_result = self.authentication.is_authenticated(request)
+
+                if isinstance(auth_result, HttpResponse):
+                    return auth_result
 
-            if isinstance(auth_result, HttpResponse):
-                return auth_result
+                if auth_result is not True:
+                    return HttpResponseUnAuthorized()
 
-            if auth_result is not True:
-                return HttpResponseUnAuthorized()
+                # MultiAuthentication tells the backend which let the request in
+                backend = getattr(request, '_authentication_backend', self.authentication)
+                if self.auth_cache and isinstance(backend, BasicAuthentication):
+                    self.auth_cache.set(request, getattr(request, 'user', None))
 
         return super(TastypieAuthViewMixIn, self).dispatch(request, *args, **kwargs)
@@ -3,8 +3,10 @@ from __future__ import unicode_literals
 import os
 from base64 import b64encode
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.test.client import RequestFactory
+from mock import patch
 try:
     from django.utils.unittest import skipUnless
 except ImportError:
@@ -12,6 +14,7 @@ except ImportError:
 
 from djangodav.views import DavView
 from djangodav.fs.resources import DummyReadFSDavResource
+from djangodav.auth.cache import AuthCache
 from djangodav.auth.rest import RestAuthViewMixIn
 
 try:
@@ -143,6 +146,46 @@ class RestAuthTest(TestCase):
         response = v(request, '/')
         self.assertIsAuthorized(response)
 
+    @skipUnless(rest_framework, "required Django Rest Framework")
+    def test_auth_cache(self):
+        """ test whether repeated Basic credentials skip the authenticator """
+        cache.clear()
+
+        class RestAuthDavView(self.viewclass):
+            authentications = (RestBasicAuthentication(),)
+            auth_cache = AuthCache(timeout=30)
+        v = RestAuthDavView.as_view()
+        header = {'HTTP_AUTHORIZATION': 'Basic %s' % b64encode(b'root:test').decode('ascii')}
+
+        with patch.object(RestBasicAuthentication, 'authenticate_credentials',
+                          wraps=RestAuthDavView.authentications[0].authenticate_credentials) as authenticate:
+            self.assertIsAuthorized(v(RequestFactory().get('/', **header), '/'))
+            self.assertIsAuthorized(v(RequestFactory().get('/', **header), '/'))
+            self.assertEqual(authenticate.call_count, 1)
+
+            # password change invalidates cached credentials
+            self.user.set_password('changed')
+            self.user.save()
+            self.assertEqual(v(RequestFactory().get('/', **header), '/').status_code, 401)
+            self.assertEqual(authenticate.call_count, 2)
+
+    @skipUnless(rest_framework, "required Django Rest Framework")
+    def test_auth_cache_session(self):
+        """ test whether a session user is not cached for the Basic credentials sent along """
+        cache.clear()
+
+        class RestAuthDavView(self.viewclass):
+            authentications = (RestSessionAuthentication(), RestBasicAuthentication())
+            auth_cache = AuthCache(timeout=30)
+        v = RestAuthDavView.as_view()
+        header = {'HTTP_AUTHORIZATION': 'Basic %s' % b64encode(b'root:wrong').decode('ascii')}
+
+        request = RequestFactory().get('/', **header)
+        request.user = self.user
+        self.assertIsAuthorized(v(request, '/'))
+        self.assertIsNone(RestAuthDavView.auth_cache.get(RequestFactory().get('/', **header)))
+        self.assertEqual(v(RequestFactory().get('/', **header), '/').status_code, 401)
+
 class UnicodeRestAuthTest(RestAuthTest):
     viewclass = TestUnicodeDAVView
 
@@ -22,6 +22,30 @@ from __future__ import unicode_literals
 
 
 from builtins import object
+
+
+def normalize_token(token):
+    """Return bare lock token of a Lock-Token header value or If header state token."""
+    token = token.strip().strip('<>')
+    if token.startswith('opaquelocktoken:'):
+        token = token[len('opaquelocktoken:'):]
+    return token
+
+
+class ActiveLock(object):
+    """Lock description as returned by lock managers: token, path, depth (0 or -1 for infinity),
+    scope, type, owner, timeout in seconds and expiration time."""
+    def __init__(self, token, path, depth, scope, type, owner, timeout, expires=None):
+        self.token = token
+        self.path = path
+        self.depth = depth
+        self.scope = scope
+        self.type = type
+        self.owner = owner
+        self.timeout = timeout
+        self.expires = expires
+
+
 class BaseLock(object):
     def __init__(self, resource):
         self.resource = resource
@@ -30,6 +54,11 @@ class BaseLock(object):
         """Gets all active locks for the requested resource. Returns a list of locks."""
         raise NotImplementedError()
 
+    def get_descendants(self):
+        """Gets active locks set on descendants of the requested resource. Returns a list of locks, None
+        when locks are not tracked."""
+        return None
+
     def acquire(self, lockscope, locktype, depth, timeout, owner):
         """Creates a new lock for the given resource."""
         raise NotImplementedError()
@@ -38,6 +67,11 @@ class BaseLock(object):
         """Releases the lock referenced by the given lock id."""
         raise NotImplementedError()
 
+    def refresh(self, token, timeout):
+        """Restarts the timeout of the lock referenced by the given lock id. Returns the lock, None if
+        there is no such lock on the resource."""
+        raise NotImplementedError()
+
     def del_locks(self):
         """Releases all locks for the given resource."""
         raise NotImplementedError()
@@ -0,0 +1,125 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from builtins import str
+from builtins import object
+
+from djangodav.utils import D
+
+
+class BasePropertyProvider(object):
+    """Computes live properties listed in names. Values are requested for a whole batch of resources
+    at once, so providers can fetch them with a single query or directory scan."""
+    names = ()
+
+    def get_property_tags(self, name, resources):
+        """Return a list with the property element for each of the resources, None where the
+        property is not available."""
+        raise NotImplementedError()
+
+
+class AttributePropertyProvider(BasePropertyProvider):
+    """Reads property values from resource attributes of the same name. Used for any property
+    without a dedicated provider."""
+
+    def get_property_tags(self, name, resources):
+        tags = []
+        for res in resources:
+            try:
+                value = getattr(res, name)
+            except AttributeError:
+                tags.append(None)
+            else:
+                tags.append(D(name, str(value)))
+        return tags
+
+
+class ResourceTypePropertyProvider(BasePropertyProvider):
+    names = ('resourcetype',)
+
+    def get_property_tags(self, name, resources):
+        return [D(name, D.collection) if res.is_collection else D(name) for res in resources]
+
+
+class PropertyRegistry(object):
+    """Maps live property names to providers."""
+
+    def __init__(self, providers=(), default=None):
+        self.providers = {}
+        self.default = default or AttributePropertyProvider()
+        for provider in providers:
+            self.register(provider)
+
+    def register(self, provider):
+        for name in provider.names:
+            self.providers[name] = provider
+        return provider
+
+    def copy(self):
+        """Return a registry with the same providers, to be extended by a resource subclass."""
+        registry = self.__class__(default=self.default)
+        registry.providers.update(self.providers)
+        return registry
+
+    def get_provider(self, name):
+        return self.providers.get(name, self.default)
+
+    def get_property_tags(self, resources, names):
+        """Return the list of available property elements for each of the resources. Every provider
+        is called once per property for the whole batch."""
+        resources = list(resources)
+        rows = [[] for _ in resources]
+        for name in names:
+            for row, tag in zip(rows, self.get_provider(name).get_property_tags(name, resources)):
+                if tag is not None:
+                    row.append(tag)
+        return rows
+
+
+default_registry = PropertyRegistry([ResourceTypePropertyProvider()])
+
+
+class BasePropertyStore(object):
+    """Storage of dead properties, the ones clients set with PROPPATCH. Properties are identified by
+    their clark names ('{namespace}name') and kept as the whole xml elements. Reads are done for a
+    batch of resources at once."""
+
+    def get_properties(self, resources, names=None):
+        """Return a list of {name: element} dicts for each of the resources, with all the stored
+        properties when names is None."""
+        raise NotImplementedError()
+
+    def set_properties(self, resource, updates):
+        """Apply the (name, element) updates to resource as a whole or not at all. Element None
+        removes the property."""
+        raise NotImplementedError()
+
+    def delete(self, resource):
+        """Delete properties of resource and of its descendants."""
+        raise NotImplementedError()
+
+    def copy(self, resource, destination):
+        """Copy properties of resource and of its descendants to destination."""
+        raise NotImplementedError()
+
+    def move(self, resource, destination):
+        """Move properties of resource and of its descendants to destination."""
+        raise NotImplementedError()
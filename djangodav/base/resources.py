@@ -21,11 +21,15 @@ from __future__ import unicode_literals
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 from builtins import str
 from builtins import object
+import calendar
+import time
 from hashlib import md5
 from mimetypes import guess_type
 
 from django.utils.http import urlquote
-from djangodav.utils import rfc3339_date, rfc1123_date, safe_join
+from django.utils.timezone import is_aware
+from djangodav.base.properties import default_registry
+from djangodav.utils import rfc3339_date, rfc1123_date, safe_join, iter_content, iter_file, iter_slice
 
 
 class BaseDavResource(object):
@@ -36,8 +40,12 @@ class BaseDavResource(object):
         '{DAV:}getlastmodified', '{DAV:}resourcetype', '{DAV:}displayname'
     ]
 
+    property_registry = default_registry
+
     path = []
 
+    read_chunk_size = 64 * 1024
+
     def __init__(self, path):
         path = str(path).strip("/")
         if path:
@@ -101,6 +109,13 @@ class BaseDavResource(object):
         """Return the modified time as datetime object."""
         raise NotImplementedError()
 
+    def get_mtime_stamp(self):
+        """Return the modified time as unix timestamp."""
+        modified = self.get_modified()
+        if is_aware(modified):
+            return calendar.timegm(modified.utctimetuple())
+        return time.mktime(modified.timetuple())
+
     @property
     def getetag(self):
         raise NotImplementedError()
@@ -109,7 +124,7 @@ class BaseDavResource(object):
         if self.is_collection:
             if not destination.exists or not destination.is_collection:
                 destination.create_collection()
-            self.copy_collection(destination, depth)
+            return self.copy_collection(destination, depth)
         else:
             if destination.is_object:
                 destination.delete()
@@ -159,8 +174,26 @@ class BaseDavResource(object):
         raise NotImplementedError()
 
     def read(self):
+        """Return the content of the resource. It can be a string, an iterator of byte chunks or a
+        readable file object. Iterators and file objects are streamed to the client, so the whole
+        content never has to be kept in memory."""
         raise NotImplementedError()
 
+    def read_range(self, start, end):
+        """Return the content between start and end byte offsets, end included. Return types are the
+        same as for read. The default implementation seeks file objects returned by read and slices
+        strings, backends which can read from an offset natively should override it."""
+        content = self.read()
+        length = end - start + 1
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if isinstance(content, bytes):
+            return content[start:end + 1]
+        if hasattr(content, 'seek'):
+            content.seek(start)
+            return iter_file(content, self.read_chunk_size, length)
+        return iter_slice(iter_content(content, self.read_chunk_size), start, length)
+
     @property
     def is_collection(self):
         raise NotImplementedError()
@@ -195,8 +228,8 @@ class MetaEtagMixIn(object):
         file system. The etag is used to detect changes to a resource between HTTP calls. So this
         needs to change if a resource is modified."""
         hashsum = md5()
-        hashsum.update(self.displayname)
-        hashsum.update(str(self.creationdate))
-        hashsum.update(str(self.getlastmodified))
-        hashsum.update(str(self.getcontentlength))
+        hashsum.update(self.displayname.encode('utf-8'))
+        hashsum.update(str(self.creationdate).encode('utf-8'))
+        hashsum.update(str(self.getlastmodified).encode('utf-8'))
+        hashsum.update(str(self.getcontentlength).encode('utf-8'))
         return hashsum.hexdigest()
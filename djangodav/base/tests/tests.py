@@ -21,7 +21,9 @@ from __future__ import unicode_literals
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 from django.test import TestCase
-from djangodav.base.resources import BaseDavResource
+from djangodav.base.properties import BasePropertyProvider, PropertyRegistry, default_registry
+from djangodav.base.resources import BaseDavResource, MetaEtagMixIn
+from djangodav.utils import D
 from djangodav.base.tests.resources import MockCollection, MockObject, MissingMockCollection
 from mock import patch, Mock
 
@@ -104,9 +106,47 @@ class TestBaseDavResource(TestCase):
         dst.create_collection.assert_called_with()
         self.assertEqual(child.copy.call_count, 0)
 
+    def test_read_range_bytes(self):
+        self.resource.read = Mock(return_value=b'0123456789')
+        self.assertEqual(self.resource.read_range(2, 4), b'234')
+
+    def test_read_range_iterator(self):
+        self.resource.read = Mock(return_value=iter([b'012', b'345', b'6789']))
+        self.assertEqual(b''.join(self.resource.read_range(2, 7)), b'234567')
+
 class TestUnicodeBaseDavResource(TestCase):
     def setUp(self):
         self.resource = BaseDavResource("/山/平/海")
 
     def test_path(self):
         self.assertEqual(self.resource.path, ['山', '平', '海'])
+
+    def test_meta_etag(self):
+        class EtagResource(MetaEtagMixIn, BaseDavResource):
+            creationdate = getlastmodified = 'Thu, 01 Jan 1970 00:00:00 GMT'
+            getcontentlength = 42
+        self.assertEqual(len(EtagResource("/山/平/海").getetag), 32)
+
+
+class TestPropertyRegistry(TestCase):
+    def setUp(self):
+        self.resources = [MockObject('/path/to/object'), MockCollection('/path/to/collection/')]
+
+    def test_default(self):
+        rows = default_registry.get_property_tags(self.resources, ['displayname', 'resourcetype', 'missing'])
+        self.assertEqual([[(tag.tag, tag.text, len(tag)) for tag in row] for row in rows], [
+            [('{DAV:}displayname', 'object', 0), ('{DAV:}resourcetype', None, 0)],
+            [('{DAV:}displayname', 'collection', 0), ('{DAV:}resourcetype', None, 1)],
+        ])
+
+    def test_batch_provider(self):
+        class ChecksumProvider(BasePropertyProvider):
+            names = ('checksum',)
+            get_property_tags = Mock(side_effect=lambda name, resources: [D(name, 'x') for res in resources])
+
+        registry = default_registry.copy()
+        registry.register(ChecksumProvider())
+        rows = registry.get_property_tags(self.resources, ['checksum', 'displayname'])
+        ChecksumProvider.get_property_tags.assert_called_once_with('checksum', self.resources)
+        self.assertEqual([[tag.text for tag in row] for row in rows], [['x', 'object'], ['x', 'collection']])
+        self.assertNotIn('checksum', default_registry.providers)
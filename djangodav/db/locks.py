@@ -0,0 +1,106 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from builtins import str
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db.models import Q
+from django.utils.timezone import now
+
+from djangodav.base.locks import BaseLock, normalize_token
+from djangodav.models import Lock
+
+
+class DBLock(BaseLock):
+    """Locks stored in djangodav.models.Lock, shared by all the processes using the database.
+
+    Conflicts are checked with indexed lookups of the resource path, of its ancestors and of its
+    descendants path prefix. A new lock is saved first and checked for conflicts afterwards, so
+    concurrent requests never both succeed; this needs autocommit (no ATOMIC_REQUESTS) to let the
+    other processes see the saved lock. Expired locks are ignored and deleted by the acquire
+    touching them."""
+
+    model = Lock
+    default_timeout = 600
+    max_timeout = 7 * 24 * 3600
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self.resource.path)
+
+    @property
+    def ancestors(self):
+        return ['/' + '/'.join(self.resource.path[:i]) for i in range(len(self.resource.path))]
+
+    @property
+    def descendants_prefix(self):
+        return self.path.rstrip('/') + '/'
+
+    def get_scope_filter(self, descendants=False):
+        """Return the filter for locks covering the resource, or its descendants too."""
+        q = Q(path=self.path) | Q(path__in=self.ancestors, depth=-1)
+        if descendants:
+            q |= Q(path__startswith=self.descendants_prefix)
+        return q
+
+    def get(self):
+        return list(self.model.objects.filter(self.get_scope_filter(), expires__gt=now()))
+
+    def get_descendants(self):
+        return list(self.model.objects.filter(path__startswith=self.descendants_prefix, expires__gt=now()))
+
+    def acquire(self, lockscope, locktype, depth, timeout, owner):
+        depth = 0 if depth == 0 else -1
+        timeout = min(timeout or self.default_timeout, self.max_timeout)
+        self.model.objects.filter(self.get_scope_filter(depth == -1), expires__lte=now()).delete()
+        lock = self.model.objects.create(
+            token=str(uuid4()), path=self.path, depth=depth, scope=lockscope, type=locktype,
+            owner=owner, timeout=timeout, expires=now() + timedelta(seconds=timeout),
+        )
+        conflicts = self.model.objects.filter(self.get_scope_filter(depth == -1), expires__gt=now())
+        if lockscope != 'exclusive':
+            conflicts = conflicts.filter(scope='exclusive')
+        if conflicts.exclude(pk=lock.pk).exists():
+            lock.delete()
+            return None
+        return lock.token
+
+    def release(self, token):
+        locks = self.model.objects.filter(self.get_scope_filter(), token=normalize_token(token))
+        if not locks.exists():
+            return False
+        locks.delete()
+        return True
+
+    def refresh(self, token, timeout):
+        timeout = min(timeout or self.default_timeout, self.max_timeout)
+        try:
+            lock = self.model.objects.get(self.get_scope_filter(), token=normalize_token(token), expires__gt=now())
+        except self.model.DoesNotExist:
+            return None
+        lock.timeout, lock.expires = timeout, now() + timedelta(seconds=timeout)
+        lock.save(update_fields=['timeout', 'expires'])
+        return lock
+
+    def del_locks(self):
+        """Delete locks of the resource and of its descendants, as it is deleted or moved."""
+        self.model.objects.filter(Q(path=self.path) | Q(path__startswith=self.descendants_prefix)).delete()
@@ -0,0 +1,92 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from django.db import transaction
+from django.db.models import Q
+try:
+    from django.db.models import Value
+    from django.db.models.functions import Concat, Substr
+except ImportError:  # Django 1.7, the oldest supported version, has no query expressions
+    Concat = Substr = Value = None
+from lxml import etree
+
+from djangodav.base.properties import BasePropertyStore
+from djangodav.models import DavProperty
+
+
+class DBPropertyStore(BasePropertyStore):
+    """Dead properties stored in djangodav.models.DavProperty rows keyed by resource path and clark
+    name. Properties of a batch of resources are fetched with a single IN query, subtrees are
+    deleted, copied and moved with path prefix queries."""
+
+    model = DavProperty
+
+    def get_path(self, resource):
+        return '/' + '/'.join(resource.path)
+
+    def get_tree_filter(self, path):
+        return Q(path=path) | Q(path__startswith=path.rstrip('/') + '/')
+
+    def get_properties(self, resources, names=None):
+        paths = [self.get_path(resource) for resource in resources]
+        rows = self.model.objects.filter(path__in=set(paths))
+        if names is not None:
+            rows = rows.filter(name__in=names)
+        props = dict((path, {}) for path in paths)
+        for path, name, value in rows.values_list('path', 'name', 'value'):
+            props[path][name] = etree.fromstring(value)
+        return [props[path] for path in paths]
+
+    def set_properties(self, resource, updates):
+        path = self.get_path(resource)
+        with transaction.atomic():
+            for name, element in updates:
+                if element is None:
+                    self.model.objects.filter(path=path, name=name).delete()
+                else:
+                    self.model.objects.update_or_create(
+                        path=path, name=name, defaults={'value': etree.tostring(element, encoding='unicode')}
+                    )
+
+    def delete(self, resource):
+        self.model.objects.filter(self.get_tree_filter(self.get_path(resource))).delete()
+
+    def copy(self, resource, destination):
+        src, dst = self.get_path(resource), self.get_path(destination)
+        rows = self.model.objects.filter(self.get_tree_filter(src))
+        with transaction.atomic():
+            self.model.objects.filter(self.get_tree_filter(dst)).delete()
+            self.model.objects.bulk_create(
+                self.model(path=dst + path[len(src):], name=name, value=value)
+                for path, name, value in rows.values_list('path', 'name', 'value').iterator()
+            )
+
+    def move(self, resource, destination):
+        src, dst = self.get_path(resource), self.get_path(destination)
+        with transaction.atomic():
+            self.model.objects.filter(self.get_tree_filter(dst)).delete()
+            rows = self.model.objects.filter(self.get_tree_filter(src))
+            if Concat is None:  # No database functions, rewritten one by one
+                for row in rows:
+                    row.path = dst + row.path[len(src):]
+                    row.save(update_fields=['path'])
+                return
+            rows.update(path=Concat(Value(dst), Substr('path', len(src) + 1)))
@@ -21,13 +21,22 @@ from __future__ import unicode_literals
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 from builtins import range
 from builtins import object
+from hashlib import md5
 from operator import and_
+from uuid import uuid4
+from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.models import Q
+try:
+    from django.db.models import Value
+    from django.db.models.functions import Concat, Substr
+except ImportError:  # Django 1.7, the oldest supported version, has no query expressions
+    Concat = Substr = Value = None
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from djangodav.base.resources import BaseDavResource
-from djangodav.utils import url_join
+from djangodav.utils import url_join, safe_join
 from functools import reduce
 
 
@@ -40,6 +49,7 @@ class BaseDBDavResource(BaseDavResource):
     modified_attribute = 'modified'
     name_attribute = 'name'
     size_attribute = 'size'
+    content_attribute = None
 
     collection_select_related = tuple()
     object_select_related = tuple()
@@ -85,30 +95,159 @@ class BaseDBDavResource(BaseDavResource):
     def get_model_kwargs(self, **kwargs):
         return kwargs or {}
 
+    descendants_batch_size = 500
+
+    def get_children_models(self):
+        return [
+            [self.collection_model, self.collection_select_related, self.collection_prefetch_related],
+            [self.object_model, self.object_select_related, self.object_prefetch_related]
+        ]
+
+    def get_children_queryset(self, model, select_related, prefetch_related, **kwargs):
+        qs = model.objects
+        if select_related:
+            qs = qs.select_related(*select_related)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+        return qs.filter(**self.get_model_kwargs(**kwargs))
+
     def get_children(self):
         """Return an iterator of all direct children of this resource."""
         if not self.exists or isinstance(self.obj, self.object_model):
             return
 
-        models = [
-            [self.collection_model, self.collection_select_related, self.collection_prefetch_related],
-            [self.object_model, self.object_select_related, self.object_prefetch_related]
-        ]
-        for model, select_related, prefetch_related in models:
-            qs = model.objects
-            if select_related:
-                qs = qs.select_related(*select_related)
-            if prefetch_related:
-                qs = qs.prefetch_related(*prefetch_related)
-            kwargs = self.get_model_kwargs(**{self.collection_attribute: self.obj})
-            for child in qs.filter(**kwargs):
+        for model, select_related, prefetch_related in self.get_children_models():
+            qs = self.get_children_queryset(model, select_related, prefetch_related,
+                                            **{self.collection_attribute: self.obj})
+            for child in qs:
                 yield self.clone(
-                    url_join(*(self.path + [child.name])),
+                    url_join(*(self.path + [getattr(child, self.name_attribute)])),
                     obj=child    # Sending ready object to reduce db requests
                 )
 
+    def load_descendants(self, depth=-1):
+        """Load the subtree of this collection level by level, with one query per model for each level
+        (and descendants_batch_size collections). Return a dict mapping collection primary keys (None
+        for the root) to the lists of their children, collections first, as get_children yields them."""
+        tree = {}
+        level = [self.obj]
+        while level and depth != 0:
+            keys = [collection.pk if collection is not None else None for collection in level]
+            for key in keys:
+                tree[key] = []
+            level = []
+            for model, select_related, prefetch_related in self.get_children_models():
+                attname = model._meta.get_field(self.collection_attribute).attname
+                for start in range(0, len(keys), self.descendants_batch_size):
+                    batch = keys[start:start + self.descendants_batch_size]
+                    if batch == [None]:
+                        kwargs = {self.collection_attribute: None}
+                    else:
+                        kwargs = {self.collection_attribute + '__in': batch}
+                    for child in self.get_children_queryset(model, select_related, prefetch_related, **kwargs):
+                        tree[getattr(child, attname)].append(child)
+                        if model is self.collection_model:
+                            level.append(child)
+            depth -= 1
+        return tree
+
+    def get_descendants(self, depth=1, include_self=True):
+        """Return an iterator of all descendants of this resource, in the same order as the generic
+        implementation. The subtree is fetched with load_descendants instead of querying children of
+        every collection."""
+        if include_self:
+            yield self
+        if depth == 0 or not self.exists or isinstance(self.obj, self.object_model):
+            return
+        tree = self.load_descendants(depth)
+        stack = [(self, iter(tree[self.obj.pk if self.obj is not None else None]))]
+        while stack:
+            parent, children = stack[-1]
+            for child in children:
+                resource = self.clone(
+                    url_join(*(parent.path + [getattr(child, self.name_attribute)])),
+                    obj=child
+                )
+                yield resource
+                if child.pk in tree and isinstance(child, self.collection_model):
+                    stack.append((resource, iter(tree[child.pk])))
+                    break
+            else:
+                stack.pop()
+
+    def has_children(self):
+        return any(
+            self.get_children_queryset(model, None, None, **{self.collection_attribute: self.obj}).exists()
+            for model, select_related, prefetch_related in self.get_children_models()
+        )
+
+    def set_location(self, obj, path, parent):
+        """Place obj to the given path (list of names) under parent collection object. Return the
+        names of changed fields."""
+        setattr(obj, self.name_attribute, path[-1])
+        setattr(obj, self.collection_attribute, parent)
+        return [self.name_attribute, self.collection_attribute]
+
+    def prepare_copy(self, obj, path, parent):
+        """Turn obj into an unsaved copy of itself placed to the given path under parent."""
+        obj.pk = None
+        self.set_location(obj, path, parent)
+        setattr(obj, self.created_attribute, now())
+        setattr(obj, self.modified_attribute, now())
+
+    def copy_collection(self, destination, depth=-1):
+        """Copy the subtree level by level in a single transaction: collections of a level are saved
+        one by one as their primary keys are needed for the next level, objects are streamed from
+        the database and inserted with bulk_create by descendants_batch_size. A destination that
+        already has children is merged into with the generic per resource copy."""
+        if (destination.is_root or isinstance(destination.obj, self.collection_model) and
+                destination.obj.pk is not None) and destination.has_children():
+            for child in self.get_descendants(depth=depth, include_self=False):
+                child.copy(self.clone(safe_join(destination.get_path(), *child.path[len(self.path):])), depth=0)
+            return
+
+        with transaction.atomic():
+            key = self.obj.pk if self.obj is not None else None
+            copies = {key: (destination.path, destination.obj)}
+            while copies and depth != 0:
+                level = {}
+                keys = list(copies)
+                for start in range(0, len(keys), self.descendants_batch_size):
+                    batch = keys[start:start + self.descendants_batch_size]
+                    if batch == [None]:
+                        kwargs = {self.collection_attribute: None}
+                    else:
+                        kwargs = {self.collection_attribute + '__in': batch}
+                    for model, select_related, prefetch_related in self.get_children_models():
+                        attname = model._meta.get_field(self.collection_attribute).attname
+                        objects = []
+                        for child in self.get_children_queryset(model, None, None, **kwargs).iterator():
+                            key = child.pk
+                            path, parent = copies[getattr(child, attname)]
+                            path = path + [getattr(child, self.name_attribute)]
+                            self.prepare_copy(child, path, parent)
+                            if model is self.collection_model:
+                                child.save(force_insert=True)
+                                level[key] = (path, child)
+                                continue
+                            objects.append(child)
+                            if len(objects) >= self.descendants_batch_size:
+                                model.objects.bulk_create(objects)
+                                objects = []
+                        if objects:
+                            model.objects.bulk_create(objects)
+                copies = level
+                depth -= 1
+
     def read(self):
-        raise NotImplementedError
+        """Return the value of content_attribute. File fields are opened and returned as is,
+        so the view streams them from the storage instead of loading them to memory."""
+        if self.content_attribute is None:
+            raise NotImplementedError
+        content = getattr(self.obj, self.content_attribute)
+        if hasattr(content, 'open'):
+            content.open('rb')
+        return content
 
     def write(self, content):
         raise NotImplementedError
@@ -117,6 +256,12 @@ class BaseDBDavResource(BaseDavResource):
         if not self.obj:
             return
         self.obj.delete()
+        self.deleted()
+
+    def deleted(self):
+        """Forget the object of this resource after it was deleted, so it no longer exists."""
+        self.__dict__['obj'] = None
+        self.__dict__.pop('exists', None)
 
 
 class NameLookupDBDavMixIn(object):
@@ -136,10 +281,18 @@ class NameLookupDBDavMixIn(object):
         name = self.path[-1]
         parent = self.clone("/".join(self.path[:-1])).obj
         kwargs = self.get_model_kwargs(**{self.collection_attribute: parent, 'name': name})
-        self.collection_model.objects.create(**kwargs)
+        self.created(self.collection_model.objects.create(**kwargs))
+
+    def created(self, obj):
+        """Remember obj just created for this resource instead of the cached lookup result."""
+        self.__dict__['obj'] = obj
+        self.__dict__.pop('exists', None)
 
     @cached_property
     def obj(self):
+        return self.lookup_obj()
+
+    def lookup_obj(self):
         if not self.path:
             return None
 
@@ -181,19 +334,226 @@ class NameLookupDBDavMixIn(object):
             raise qs.model.DoesNotExist()
 
     def copy_object(self, destination):
-        self.obj.pk = None
-        name = destination.path[-1]
-        collection = self.clone(destination.get_parent_path()).obj
-        setattr(self.obj, self.name_attribute, name)
-        setattr(self.obj, self.collection_attribute, collection)
-        setattr(self.obj, self.created_attribute, now())
-        setattr(self.obj, self.modified_attribute, now())
+        self.prepare_copy(self.obj, destination.path, self.clone(destination.get_parent_path()).obj)
         self.obj.save(force_insert=True)
 
     def move_object(self, destination):
-        name = destination.path[-1]
-        collection = self.clone(destination.get_parent_path()).obj
-        setattr(self.obj, self.name_attribute, name)
-        setattr(self.obj, self.collection_attribute, collection)
+        fields = self.set_location(self.obj, destination.path, self.clone(destination.get_parent_path()).obj)
         setattr(self.obj, self.modified_attribute, now())
-        self.obj.save(update_fields=[self.name_attribute, self.collection_attribute, self.modified_attribute])
+        self.obj.save(update_fields=fields + [self.modified_attribute])
+
+    def move(self, destination):
+        """A collection moved to a free destination outside of its own subtree is re-parented in
+        place with move_object, its descendants follow without being touched."""
+        if self.is_collection and self.obj is not None and not destination.exists and \
+                destination.path[:len(self.path)] != self.path:
+            with transaction.atomic():
+                self.move_object(destination)
+        else:
+            super(NameLookupDBDavMixIn, self).move(destination)
+
+
+class MaterializedPathDBDavMixIn(NameLookupDBDavMixIn):
+    """Object lookup by an indexed column storing the full path of every collection and object, so
+    any path is resolved with a single equality lookup instead of joining collections table once per
+    path segment. Resource write has to fill the column for new objects, see get_path_value."""
+
+    path_attribute = 'path'
+
+    def get_path_value(self, path=None):
+        """Return the value of path column for the given path (list of names), this resource by default."""
+        return "/".join(self.path if path is None else path)
+
+    def get_model_by_path(self, model_attr, path):
+        if not path:
+            return None
+
+        qs = getattr(self, "%s_model" % model_attr).objects.filter(
+            **self.get_model_kwargs(**{self.path_attribute: self.get_path_value(path)})
+        )
+
+        select_related = getattr(self, "%s_select_related" % model_attr)
+        if select_related:
+            qs = qs.select_related(*select_related)
+
+        prefetch_related = getattr(self, "%s_prefetch_related" % model_attr)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+
+        try:
+            return qs[0]
+        except IndexError:
+            raise qs.model.DoesNotExist()
+
+    def create_collection(self):
+        parent = self.clone(self.get_parent_path()).obj
+        kwargs = self.get_model_kwargs(**{
+            self.collection_attribute: parent,
+            self.name_attribute: self.path[-1],
+            self.path_attribute: self.get_path_value(),
+        })
+        self.created(self.collection_model.objects.create(**kwargs))
+
+    def move_object(self, destination):
+        old = self.get_path_value()
+        super(MaterializedPathDBDavMixIn, self).move_object(destination)
+        if isinstance(self.obj, self.collection_model):
+            self.update_descendant_paths(old, self.get_path_value(destination.path))
+
+    def update_descendant_paths(self, old, new):
+        """Replace old prefix of path column with new for all descendants of a moved collection."""
+        prefix = old + '/'
+        for model, select_related, prefetch_related in self.get_children_models():
+            qs = model.objects.filter(**self.get_model_kwargs(**{self.path_attribute + '__startswith': prefix}))
+            if Concat is None:  # No database functions, rewritten one by one
+                for obj in qs:
+                    setattr(obj, self.path_attribute, new + '/' + getattr(obj, self.path_attribute)[len(prefix):])
+                    obj.save(update_fields=[self.path_attribute])
+                continue
+            qs.update(**{
+                self.path_attribute: Concat(Value(new + '/'), Substr(self.path_attribute, len(prefix) + 1))
+            })
+
+    def set_location(self, obj, path, parent):
+        fields = super(MaterializedPathDBDavMixIn, self).set_location(obj, path, parent)
+        setattr(obj, self.path_attribute, self.get_path_value(path))
+        return fields + [self.path_attribute]
+
+
+class CachedLookupDBDavMixIn(object):
+    """Caches the kind and primary key of resolved paths in Django cache framework, so existence
+    checks are answered without the database and objects are fetched by primary key instead of
+    path lookup. Goes before the lookup mixin: class R(CachedLookupDBDavMixIn, NameLookupDBDavMixIn, ...).
+
+    Size and eviction are left to the cache behind lookup_cache_alias: local memory, file and
+    database caches are bounded by their MAX_ENTRIES option, memcached and redis by their memory
+    limit and eviction policy. Delete, move and copy drop the keys of the paths they change. Every
+    collection path has a generation, entries are valid for the generations of the ancestors they were
+    stored with, so operations on a collection renew its generation and only entries below it are
+    dropped. Override get_lookup_cache_key if get_model_kwargs scopes lookups, per user for example."""
+
+    lookup_cache_alias = 'default'
+    lookup_cache_timeout = 60
+    lookup_cache_prefix = 'djangodav:lookup'
+
+    @property
+    def lookup_cache(self):
+        return caches[self.lookup_cache_alias]
+
+    def get_lookup_generation_key(self, path):
+        """Return the cache key of the generation of collection path, shared by all resource classes."""
+        return '%s:generation:%s' % (self.lookup_cache_prefix, md5("/".join(path).encode('utf-8')).hexdigest())
+
+    def get_lookup_cache_key(self, path=None):
+        path = "/".join(self.path if path is None else path)
+        name = '%s.%s:%s' % (self.__class__.__module__, self.__class__.__name__, path)
+        return '%s:%s' % (self.lookup_cache_prefix, md5(name.encode('utf-8')).hexdigest())
+
+    @cached_property
+    def lookup_generation_keys(self):
+        """Return the cache keys of the generations of the ancestor collections of the resource."""
+        return [self.get_lookup_generation_key(self.path[:depth]) for depth in range(1, len(self.path))]
+
+    def get_lookup_generations(self, values):
+        """Return the generations of the ancestor collections of the resource from values fetched with
+        get_many. Missing ones were never set or evicted, entries stored before can't be trusted."""
+        keys = self.lookup_generation_keys
+        missing = [key for key in keys if values.get(key) is None]
+        for key in missing:
+            self.lookup_cache.add(key, uuid4().hex, None)
+        if missing:
+            values = dict(values, **self.lookup_cache.get_many(missing))
+        return tuple(values.get(key) for key in keys)
+
+    @cached_property
+    def lookup_entry(self):
+        """Return cached ('collection' or 'object', primary key) of the resource, None if it is unknown."""
+        if not self.path:
+            return None
+        key = self.get_lookup_cache_key()
+        values = self.lookup_cache.get_many([key] + self.lookup_generation_keys)
+        entry = values.get(key)
+        if entry is None or entry[0] != self.get_lookup_generations(values):
+            return None
+        return entry[1:]
+
+    def store_lookup_entry(self, obj):
+        kind = 'collection' if isinstance(obj, self.collection_model) else 'object'
+        generations = self.get_lookup_generations(self.lookup_cache.get_many(self.lookup_generation_keys))
+        self.lookup_cache.set(self.get_lookup_cache_key(), (generations, kind, obj.pk), self.lookup_cache_timeout)
+
+    def invalidate_lookup(self, path=None):
+        self.lookup_cache.delete(self.get_lookup_cache_key(path))
+
+    def invalidate_lookup_tree(self):
+        """Drop the entry of this collection and of everything below it."""
+        self.invalidate_lookup()
+        self.lookup_cache.set(self.get_lookup_generation_key(self.path), uuid4().hex, None)
+
+    def get_model_by_pk(self, model_attr, pk):
+        qs = getattr(self, "%s_model" % model_attr).objects.filter(**self.get_model_kwargs(pk=pk))
+
+        select_related = getattr(self, "%s_select_related" % model_attr)
+        if select_related:
+            qs = qs.select_related(*select_related)
+
+        prefetch_related = getattr(self, "%s_prefetch_related" % model_attr)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+
+        try:
+            return qs[0]
+        except IndexError:
+            raise qs.model.DoesNotExist()
+
+    def lookup_obj(self):
+        if self.lookup_entry is not None:
+            try:
+                return self.get_model_by_pk(*self.lookup_entry)
+            except ObjectDoesNotExist:  # Changed behind our back
+                self.invalidate_lookup()
+        obj = super(CachedLookupDBDavMixIn, self).lookup_obj()
+        if obj is not None:
+            self.store_lookup_entry(obj)
+        return obj
+
+    @cached_property
+    def exists(self):
+        if 'obj' not in self.__dict__ and self.lookup_entry is not None:
+            return True
+        return super(CachedLookupDBDavMixIn, self).exists
+
+    @property
+    def is_collection(self):
+        if 'obj' not in self.__dict__ and self.lookup_entry is not None:
+            return self.lookup_entry[0] == 'collection'
+        return super(CachedLookupDBDavMixIn, self).is_collection
+
+    @property
+    def is_object(self):
+        if 'obj' not in self.__dict__ and self.lookup_entry is not None:
+            return self.lookup_entry[0] == 'object'
+        return super(CachedLookupDBDavMixIn, self).is_object
+
+    def delete(self):
+        if self.is_collection:
+            self.invalidate_lookup_tree()
+        else:
+            self.invalidate_lookup()
+        super(CachedLookupDBDavMixIn, self).delete()
+
+    def deleted(self):
+        self.__dict__.pop('lookup_entry', None)
+        super(CachedLookupDBDavMixIn, self).deleted()
+
+    def move(self, destination):
+        if self.is_collection:
+            self.invalidate_lookup_tree()
+        else:
+            self.invalidate_lookup()
+        destination.invalidate_lookup()
+        super(CachedLookupDBDavMixIn, self).move(destination)
+
+    def copy(self, destination, depth=-1):
+        destination.invalidate_lookup()
+        super(CachedLookupDBDavMixIn, self).copy(destination, depth)
@@ -0,0 +1,409 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils.timezone import now
+from lxml import etree
+
+from djangodav.acls import FullAcl
+from djangodav.base.resources import BaseDavResource
+from djangodav.db.locks import DBLock
+from djangodav.db.properties import DBPropertyStore
+from djangodav.locks import DummyLock
+from djangodav.views import DavView
+from djangodav.db.resources import BaseDBDavResource, CachedLookupDBDavMixIn, MaterializedPathDBDavMixIn, \
+    NameLookupDBDavMixIn
+from djangodav.models import DavProperty, Lock
+from djangodav.testapp.models import PathSampleCollection, PathSampleObject, SampleCollection, SampleObject
+from mock import patch
+
+
+class DBDavResource(NameLookupDBDavMixIn, BaseDBDavResource):
+    collection_model = SampleCollection
+    object_model = SampleObject
+
+
+class PathDBDavResource(MaterializedPathDBDavMixIn, BaseDBDavResource):
+    collection_model = PathSampleCollection
+    object_model = PathSampleObject
+
+
+class CachedDBDavResource(CachedLookupDBDavMixIn, DBDavResource):
+    pass
+
+
+class GenericDBDavResource(DBDavResource):
+    get_descendants = BaseDavResource.__dict__['get_descendants']
+
+
+class DBResourceTestCase(TestCase):
+    resource_class = DBDavResource
+
+    def make_tree(self, paths):
+        """Create collections (paths ending with slash) and objects of paths, parents first."""
+        for path in paths:
+            resource = self.resource_class(path)
+            parent = self.resource_class(resource.get_parent_path()).obj
+            if path.endswith('/'):
+                resource.create_collection()
+            else:
+                kwargs = {'path': resource.get_path_value()} if hasattr(resource, 'path_attribute') else {}
+                self.resource_class.object_model.objects.create(
+                    name=resource.path[-1], parent=parent, size=len(path), **kwargs)
+
+    def get_stored_paths(self):
+        return sorted(
+            list(self.resource_class.collection_model.objects.values_list('path', flat=True)) +
+            list(self.resource_class.object_model.objects.values_list('path', flat=True))
+        )
+
+    def get_paths(self, path='/', depth=-1):
+        return [resource.get_path() for resource in self.resource_class(path).get_descendants(depth=depth)]
+
+    def relocate(self, method, path, destination, **meta):
+        """Serve COPY or MOVE request of path to destination with DavView, return the response."""
+        view = DavView.as_view(resource_class=self.resource_class, lock_class=DummyLock, acl_class=FullAcl)
+        request = RequestFactory().generic(
+            method, '/dav' + path, HTTP_DESTINATION='http://testserver/dav' + destination, **meta)
+        return view(request, path=path)
+
+
+class TestDBDavResource(DBResourceTestCase):
+    def setUp(self):
+        self.make_tree(['/a/', '/a/x/', '/a/x/1', '/a/x/y/', '/a/2', '/a/3', '/b/', '/b/z/', '/b/4', '/5'])
+
+    def test_get_descendants(self):
+        self.resource_class = GenericDBDavResource
+        expected = [self.get_paths(depth=depth) for depth in (-1, 0, 1, 2)] + [self.get_paths('/a/')]
+        self.resource_class = DBDavResource
+        self.assertEqual([self.get_paths(depth=depth) for depth in (-1, 0, 1, 2)] + [self.get_paths('/a/')], expected)
+        self.assertEqual(expected[0], ['/', '/a/', '/a/x/', '/a/x/y/', '/a/x/1', '/a/2', '/a/3', '/b/', '/b/z/',
+                                       '/b/4', '/5'])
+
+    def test_get_descendants_queries(self):
+        with self.assertNumQueries(8):  # Collections and objects of each of the 4 levels
+            self.get_paths()
+        self.resource_class.descendants_batch_size = 1
+        try:
+            with self.assertNumQueries(12):  # One query per model and collection of a level
+                self.get_paths()
+        finally:
+            del self.resource_class.descendants_batch_size
+
+    def test_copy_collection(self):
+        self.resource_class('/a/').copy(self.resource_class('/c/'))
+        self.assertEqual(self.get_paths('/c/'), ['/c/', '/c/x/', '/c/x/y/', '/c/x/1', '/c/2', '/c/3'])
+        self.assertEqual(self.get_paths('/a/'), ['/a/', '/a/x/', '/a/x/y/', '/a/x/1', '/a/2', '/a/3'])
+        self.assertEqual(self.resource_class('/c/x/1').obj.size, len('/a/x/1'))
+        self.assertNotEqual(self.resource_class('/c/x/1').obj.pk, self.resource_class('/a/x/1').obj.pk)
+
+    def test_copy_collection_queries(self):
+        source, destination = self.resource_class('/a/'), self.resource_class('/c/')
+        destination.create_collection()
+        self.assertTrue(source.obj)
+        # Children check, collections and objects of 3 levels, 2 saved collections, 2 bulk inserts, savepoint
+        with self.assertNumQueries(14):
+            source.copy_collection(destination)
+
+    def test_copy_overwrite(self):
+        self.assertEqual(self.relocate('COPY', '/a/', '/b/', HTTP_OVERWRITE='T', HTTP_DEPTH='infinity').status_code, 204)
+        self.assertEqual(self.get_paths(), ['/', '/a/', '/a/x/', '/a/x/y/', '/a/x/1', '/a/2', '/a/3', '/b/', '/b/x/',
+                                            '/b/x/y/', '/b/x/1', '/b/2', '/b/3', '/5'])
+
+    def test_copy_collection_depth(self):
+        self.resource_class('/a/').copy(self.resource_class('/c/'), depth=1)
+        self.assertEqual(self.get_paths('/c/'), ['/c/', '/c/x/', '/c/2', '/c/3'])
+        self.resource_class('/a/').copy(self.resource_class('/d/'), depth=0)
+        self.assertEqual(self.get_paths('/d/'), ['/d/'])
+
+    def test_copy_collection_merge(self):
+        self.resource_class('/a/').copy(self.resource_class('/b/'))
+        self.assertEqual(sorted(self.get_paths('/b/')), ['/b/', '/b/2', '/b/3', '/b/4', '/b/x/', '/b/x/1', '/b/x/y/',
+                                                         '/b/z/'])
+        self.assertEqual(self.resource_class.collection_model.objects.filter(name='x').count(), 2)
+        self.assertEqual(self.resource_class.object_model.objects.filter(name='1').count(), 2)
+
+    def test_copy_collection_merge_depth(self):
+        self.resource_class('/a/').copy(self.resource_class('/b/'), depth=1)
+        self.assertEqual(sorted(self.get_paths('/b/')), ['/b/', '/b/2', '/b/3', '/b/4', '/b/x/', '/b/z/'])
+
+
+    def test_move_rename(self):
+        source, destination = self.resource_class('/a/x/'), self.resource_class('/a/z/')
+        pks = [obj.pk for obj in self.resource_class.object_model.objects.filter(name='1')]
+        self.assertTrue(source.obj)
+        self.assertFalse(destination.exists)
+        with self.assertNumQueries(4):  # Parent lookup, update and savepoint around it
+            source.move(destination)
+        self.assertEqual(self.get_paths('/a/'), ['/a/', '/a/z/', '/a/z/y/', '/a/z/1', '/a/2', '/a/3'])
+        self.assertEqual([self.resource_class('/a/z/1').obj.pk], pks)
+
+    def test_move_collection(self):
+        self.resource_class('/a/x/').move(self.resource_class('/b/z/w/'))
+        self.assertEqual(self.get_paths('/b/'), ['/b/', '/b/z/', '/b/z/w/', '/b/z/w/y/', '/b/z/w/1', '/b/4'])
+        self.assertEqual(self.get_paths('/a/'), ['/a/', '/a/2', '/a/3'])
+
+    def test_delete(self):
+        resource = self.resource_class('/a/x/')
+        self.assertTrue(resource.exists)
+        resource.delete()
+        self.assertFalse(resource.exists)
+        self.assertIsNone(resource.obj)
+        self.assertEqual(self.get_paths('/a/'), ['/a/', '/a/2', '/a/3'])
+
+    def test_move_overwrite(self):
+        self.assertEqual(self.relocate('MOVE', '/a/', '/b/', HTTP_OVERWRITE='T').status_code, 204)
+        self.assertEqual(self.get_paths(), ['/', '/b/', '/b/x/', '/b/x/y/', '/b/x/1', '/b/2', '/b/3', '/5'])
+
+    def test_move_into_own_subtree(self):
+        with patch.object(BaseDavResource, 'move') as move, \
+                patch.object(self.resource_class, 'move_object') as move_object:
+            source, destination = self.resource_class('/a/'), self.resource_class('/a/x/y/a/')
+            source.move(destination)
+        move.assert_called_once_with(destination)
+        self.assertFalse(move_object.called)
+        self.assertIsNone(self.resource_class('/a/').obj.parent)
+
+
+class TestMaterializedPathDBDavResource(DBResourceTestCase):
+    resource_class = PathDBDavResource
+
+    def setUp(self):
+        self.make_tree(['/a/', '/a/x/', '/a/x/1', '/a/x/y/', '/a/2'])
+
+    def test_lookup(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resource_class('/a/x/1').obj.path, 'a/x/1')
+        with self.assertNumQueries(1):
+            self.assertTrue(self.resource_class('/a/x/y/').is_collection)
+        with self.assertNumQueries(2):
+            self.assertFalse(self.resource_class('/a/x/z').exists)
+
+    def test_create_copy(self):
+        self.assertEqual(self.get_stored_paths(), ['a', 'a/2', 'a/x', 'a/x/1', 'a/x/y'])
+        self.resource_class('/a/x/1').copy(self.resource_class('/a/3'))
+        self.assertEqual(self.resource_class('/a/3').obj.parent.path, 'a')
+        self.resource_class('/a/x/').copy(self.resource_class('/b/'))
+        self.assertEqual(self.get_stored_paths(), ['a', 'a/2', 'a/3', 'a/x', 'a/x/1', 'a/x/y', 'b', 'b/1', 'b/y'])
+
+    def test_copy_collection(self):
+        self.make_tree(['/b/', '/b/4'])
+        self.resource_class('/a/').copy(self.resource_class('/c/'))
+        self.resource_class('/a/').copy(self.resource_class('/b/'), depth=2)
+        self.assertEqual(self.get_stored_paths(), [
+            'a', 'a/2', 'a/x', 'a/x/1', 'a/x/y', 'b', 'b/2', 'b/4', 'b/x', 'b/x/1', 'b/x/y',
+            'c', 'c/2', 'c/x', 'c/x/1', 'c/x/y',
+        ])
+        self.assertEqual(self.resource_class('/c/x/1').obj.parent.path, 'c/x')
+        self.assertEqual(self.resource_class('/b/x/y/').obj.parent.path, 'b/x')
+
+    def test_move(self):
+        self.make_tree(['/a/xx/', '/a/xx/3'])
+        self.resource_class('/a/x/').move(self.resource_class('/a/z/'))
+        self.assertEqual(self.get_stored_paths(), ['a', 'a/2', 'a/xx', 'a/xx/3', 'a/z', 'a/z/1', 'a/z/y'])
+        self.assertEqual(self.resource_class('/a/z/y/').obj.parent.path, 'a/z')
+        self.resource_class('/a/z/').move(self.resource_class('/b/'))
+        self.assertEqual(self.get_stored_paths(), ['a', 'a/2', 'a/xx', 'a/xx/3', 'b', 'b/1', 'b/y'])
+        self.assertTrue(self.resource_class('/b/y/').is_collection)
+
+    @patch('djangodav.db.resources.Concat', None)
+    def test_move_without_database_functions(self):
+        self.resource_class('/a/x/').move(self.resource_class('/b/'))
+        self.assertEqual(self.get_stored_paths(), ['a', 'a/2', 'b', 'b/1', 'b/y'])
+
+
+class TestCachedLookupDBDavResource(DBResourceTestCase):
+    resource_class = CachedDBDavResource
+
+    def setUp(self):
+        cache.clear()
+        self.make_tree(['/a/', '/a/x/', '/a/x/1', '/a/2', '/a/3'])
+
+    def cached(self, path):
+        resource = self.resource_class(path)
+        return resource.lookup_cache.get(resource.get_lookup_cache_key())
+
+    def test_cached_lookup(self):
+        self.assertTrue(self.resource_class('/a/x/').exists)
+        self.assertTrue(self.resource_class('/a/x/1').exists)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.resource_class('/a/x/').is_collection)
+            self.assertTrue(self.resource_class('/a/x/1').is_object)
+            self.assertTrue(self.resource_class('/a/x/1').exists)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.resource_class('/a/x/1').obj.name, '1')
+
+    def test_stale_entry(self):
+        self.assertTrue(self.resource_class('/a/2').exists)
+        self.resource_class.object_model.objects.filter(name='2').delete()
+        self.assertFalse(self.resource_class('/a/2').obj)
+        self.assertIsNone(self.cached('/a/2'))
+        self.make_tree(['/a/2'])
+        self.assertEqual(self.resource_class('/a/2').obj.name, '2')
+
+    def test_collection_delete_move(self):
+        self.assertTrue(self.resource_class('/a/x/1').exists)
+        self.resource_class('/a/x/').move(self.resource_class('/b/'))
+        self.assertFalse(self.resource_class('/a/x/1').exists)
+        self.assertTrue(self.resource_class('/b/1').exists)
+        self.resource_class('/b/').delete()
+        self.assertFalse(self.resource_class('/b/1').exists)
+        self.assertTrue(self.resource_class('/a/2').exists)
+
+    def test_tree_invalidation(self):
+        self.make_tree(['/b/', '/b/4'])
+        for path in ('/a/x/1', '/a/2', '/b/4', '/b/'):
+            self.assertTrue(self.resource_class(path).exists)
+        self.resource_class('/a/x/').move(self.resource_class('/a/z/'))
+        self.assertIsNone(self.resource_class('/a/x/1').lookup_entry)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.resource_class('/a/2').exists)
+            self.assertTrue(self.resource_class('/b/4').exists)
+        self.resource_class('/a/').delete()
+        self.assertIsNone(self.resource_class('/a/2').lookup_entry)
+        self.assertIsNone(self.cached('/a/'))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.resource_class('/b/4').is_object)
+            self.assertTrue(self.resource_class('/b/').is_collection)
+
+    def test_move_overwrite(self):
+        self.make_tree(['/b/', '/b/4'])
+        self.assertTrue(self.resource_class('/b/').exists)
+        self.assertEqual(self.relocate('MOVE', '/a/', '/b/', HTTP_OVERWRITE='T').status_code, 204)
+        self.assertEqual(self.get_paths(), ['/', '/b/', '/b/x/', '/b/x/1', '/b/2', '/b/3'])
+        self.assertFalse(self.resource_class('/b/4').exists)
+
+    def test_object_move_copy(self):
+        self.assertTrue(self.resource_class('/a/2').exists)
+        self.assertTrue(self.resource_class('/a/3').exists)
+        self.resource_class('/a/3').delete()
+        self.resource_class('/a/2').move(self.resource_class('/a/3'))
+        self.assertIsNone(self.cached('/a/2'))
+        self.assertFalse(self.resource_class('/a/2').exists)
+        self.assertTrue(self.resource_class('/a/3').exists)
+        self.assertTrue(self.cached('/a/3'))
+        self.resource_class('/a/3').delete()
+        self.resource_class('/a/x/1').copy(self.resource_class('/a/3'))
+        self.assertIsNone(self.cached('/a/3'))
+        self.assertTrue(self.resource_class('/a/3').exists)
+        self.assertTrue(self.resource_class('/a/x/1').exists)
+
+
+class TestDBLock(TestCase):
+    def acquire(self, path, scope='exclusive', depth=-1):
+        return DBLock(BaseDavResource(path)).acquire(scope, 'write', depth, 600, 'owner')
+
+    def test_acquire_release(self):
+        token = self.acquire('/a/b')
+        self.assertTrue(token)
+        self.assertEqual([lock.token for lock in DBLock(BaseDavResource('/a/b/c')).get()], [token])
+        self.assertFalse(DBLock(BaseDavResource('/a/b')).release('other'))
+        self.assertTrue(DBLock(BaseDavResource('/a/b')).release('<opaquelocktoken:%s>' % token))
+        self.assertEqual(Lock.objects.count(), 0)
+
+    def test_conflicts(self):
+        self.assertTrue(self.acquire('/a/b', depth=0))
+        self.assertIsNone(self.acquire('/a/b'))
+        self.assertIsNone(self.acquire('/a'))  # Depth infinity covers locked descendant
+        self.assertTrue(self.acquire('/a', depth=0))
+        self.assertTrue(self.acquire('/a/b/c'))  # Depth 0 lock doesn't cover children
+        self.assertTrue(self.acquire('/x', scope='shared'))
+        self.assertTrue(self.acquire('/x/y', scope='shared'))
+        self.assertIsNone(self.acquire('/x/y/z'))
+        self.assertIsNone(self.acquire('/'))
+
+    def test_expired(self):
+        self.acquire('/a')
+        Lock.objects.update(expires=now() - timedelta(seconds=1))
+        self.assertEqual(DBLock(BaseDavResource('/a')).get(), [])
+        self.assertTrue(self.acquire('/a/b'))
+        self.assertEqual(list(Lock.objects.values_list('path', flat=True)), ['/a/b'])
+
+    def test_del_locks(self):
+        self.acquire('/a/b')
+        self.acquire('/a/c/d')
+        self.acquire('/ab')
+        DBLock(BaseDavResource('/a/')).del_locks()
+        self.assertEqual(list(Lock.objects.values_list('path', flat=True)), ['/ab'])
+
+    def test_get_descendants(self):
+        self.acquire('/a', depth=0)
+        token = self.acquire('/a/b/c')
+        self.acquire('/ab')
+        self.assertEqual([lock.token for lock in DBLock(BaseDavResource('/a/')).get_descendants()], [token])
+
+    def test_refresh(self):
+        token = self.acquire('/a')
+        Lock.objects.update(expires=now() + timedelta(seconds=1))
+        lock = DBLock(BaseDavResource('/a/b')).refresh('opaquelocktoken:%s' % token, 3600)
+        self.assertEqual(lock.timeout, 3600)
+        self.assertGreater(Lock.objects.get().expires, now() + timedelta(seconds=3000))
+        self.assertIsNone(DBLock(BaseDavResource('/b')).refresh(token, 3600))
+
+
+class TestDBPropertyStore(TestCase):
+    def setUp(self):
+        self.store = DBPropertyStore()
+        self.store.set_properties(BaseDavResource('/a/'), [('{urn:x}color', etree.fromstring('<color xmlns="urn:x">red</color>'))])
+        self.store.set_properties(BaseDavResource('/a/b'), [('{urn:x}size', etree.fromstring('<size xmlns="urn:x">2</size>'))])
+        self.store.set_properties(BaseDavResource('/ab'), [('{urn:x}size', etree.fromstring('<size xmlns="urn:x">3</size>'))])
+
+    def paths(self):
+        return sorted(DavProperty.objects.values_list('path', 'name'))
+
+    def test_get_properties(self):
+        resources = [BaseDavResource('/a/'), BaseDavResource('/a/b'), BaseDavResource('/c')]
+        with self.assertNumQueries(1):
+            rows = self.store.get_properties(resources)
+        self.assertEqual([dict((name, el.text) for name, el in row.items()) for row in rows],
+                         [{'{urn:x}color': 'red'}, {'{urn:x}size': '2'}, {}])
+        self.assertEqual(self.store.get_properties(resources, ['{urn:x}size'])[0], {})
+
+    def test_set_properties(self):
+        resource = BaseDavResource('/a/b')
+        self.store.set_properties(resource, [
+            ('{urn:x}size', etree.fromstring('<size xmlns="urn:x">5</size>')),
+            ('{urn:x}color', etree.fromstring('<color xmlns="urn:x">blue</color>')),
+            ('{urn:x}color', None),
+        ])
+        self.assertEqual([(name, el.text) for name, el in self.store.get_properties([resource])[0].items()],
+                         [('{urn:x}size', '5')])
+
+    def test_delete(self):
+        self.store.delete(BaseDavResource('/a/'))
+        self.assertEqual(self.paths(), [('/ab', '{urn:x}size')])
+
+    def test_copy(self):
+        self.store.copy(BaseDavResource('/a/'), BaseDavResource('/c/'))
+        self.assertEqual(self.paths(), [('/a', '{urn:x}color'), ('/a/b', '{urn:x}size'), ('/ab', '{urn:x}size'),
+                                        ('/c', '{urn:x}color'), ('/c/b', '{urn:x}size')])
+
+    def test_move(self):
+        self.store.move(BaseDavResource('/a/'), BaseDavResource('/ab/'))
+        self.assertEqual(self.paths(), [('/ab', '{urn:x}color'), ('/ab/b', '{urn:x}size')])
+
+    @patch('djangodav.db.properties.Concat', None)
+    def test_move_without_database_functions(self):
+        self.test_move()
@@ -0,0 +1,206 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+import os
+import tempfile
+from copy import deepcopy
+
+from lxml import etree
+
+from djangodav.base.properties import BasePropertyStore
+from djangodav.fs.utils import XATTR_UNSUPPORTED_ERRNOS, copy_tree, copy_xattrs, remove_path
+from djangodav.responses import HttpResponseInsufficientStorage, ResponseException
+from djangodav.utils import D
+
+ENODATA = getattr(errno, 'ENODATA', None)
+XATTR_FULL_ERRNOS = (errno.E2BIG, errno.ENOSPC)  # Value over the size limit of the file system, no room left
+
+
+def serialize_properties(props):
+    """Serialize {clark name: element} dict of dead properties to an xml document."""
+    return etree.tostring(D.prop(*[deepcopy(props[name]) for name in sorted(props)]), encoding='utf-8')
+
+
+def parse_properties(data):
+    return dict((el.tag, el) for el in etree.fromstring(data) if isinstance(el.tag, str))
+
+
+def apply_updates(props, updates):
+    for name, element in updates:
+        if element is None:
+            props.pop(name, None)
+        else:
+            props[name] = element
+    return props
+
+
+class SidecarPropertyStore(BasePropertyStore):
+    """Keeps dead properties of filesystem resources in files of a separate directory tree under
+    root, mirroring the resource tree: a resource at a/b has its properties in root/a.d/b.d/properties.
+    Without root nothing can be stored."""
+
+    root = None
+    file_name = 'properties'
+
+    def __init__(self, root=None):
+        self.root = root or self.root
+
+    def get_dir(self, resource):
+        return os.path.join(self.root, *[name + '.d' for name in resource.path])
+
+    def read(self, resource):
+        try:
+            with open(os.path.join(self.get_dir(resource), self.file_name), 'rb') as f:
+                return parse_properties(f.read())
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return {}
+
+    def get_properties(self, resources, names=None):
+        if self.root is None:
+            return [{} for _ in resources]
+        rows = []
+        for resource in resources:
+            props = self.read(resource)
+            rows.append(props if names is None else dict((name, props[name]) for name in names if name in props))
+        return rows
+
+    def set_properties(self, resource, updates):
+        if self.root is None:
+            raise ResponseException(HttpResponseInsufficientStorage('Dead properties are not supported here.'))
+        directory = self.get_dir(resource)
+        data = serialize_properties(apply_updates(self.read(resource), updates))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(prefix='.%s.' % self.file_name, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(temp_path, os.path.join(directory, self.file_name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def delete(self, resource):
+        if self.root is not None and os.path.isdir(self.get_dir(resource)):
+            remove_path(self.get_dir(resource))
+
+    def copy(self, resource, destination):
+        if self.root is None or not os.path.isdir(self.get_dir(resource)):
+            return
+        self.delete(destination)
+        os.makedirs(self.get_dir(destination))
+        copy_tree(self.get_dir(resource), self.get_dir(destination))
+
+    def move(self, resource, destination):
+        if self.root is None or not os.path.isdir(self.get_dir(resource)):
+            return
+        self.delete(destination)
+        parent = os.path.dirname(self.get_dir(destination))
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        os.rename(self.get_dir(resource), self.get_dir(destination))
+
+
+class XattrPropertyStore(BasePropertyStore):
+    """Keeps dead properties of filesystem resources in the user extended attribute named by
+    attribute, as one xml document per resource, so an update is a single setxattr. Properties move
+    with the resources on rename (cross device moves keep them with preserve_metadata of the
+    resource), copies get them from copy. Resources on file systems without
+    extended attributes use the fallback store (a sidecar tree under sidecar_root by default).
+    Properties not fitting the attribute size limit are refused with 507 Insufficient Storage."""
+
+    attribute = 'user.djangodav.properties'
+    fallback_class = SidecarPropertyStore
+    sidecar_root = None
+
+    def __init__(self):
+        self.fallback = self.fallback_class(self.sidecar_root)
+
+    def read(self, path):
+        """Return the properties of path, None if its file system has no extended attributes."""
+        if not hasattr(os, 'getxattr'):
+            return None
+        try:
+            return parse_properties(os.getxattr(path, self.attribute))
+        except OSError as e:
+            if e.errno == ENODATA:
+                return {}
+            if e.errno in XATTR_UNSUPPORTED_ERRNOS:
+                return None
+            raise
+
+    def get_properties(self, resources, names=None):
+        """Extended attributes are read for resources of file systems supporting them, known from
+        the first resource of every device. The stat results of the directory listing are cached,
+        so a batch of siblings needs one getxattr each and no more syscalls."""
+        resources = list(resources)
+        rows, fallback, supported = [], [], {}
+        for index, resource in enumerate(resources):
+            device = getattr(resource.stat, 'st_dev', None)
+            props = self.read(resource.get_abs_path()) if supported.get(device, True) else None
+            supported[device] = props is not None
+            if props is None:
+                fallback.append(index)
+                props = {}
+            rows.append(props if names is None else dict((name, props[name]) for name in names if name in props))
+        if fallback:
+            for index, props in zip(fallback, self.fallback.get_properties([resources[i] for i in fallback], names)):
+                rows[index] = props
+        return rows
+
+    def set_properties(self, resource, updates):
+        path = resource.get_abs_path()
+        props = self.read(path)
+        if props is None:
+            return self.fallback.set_properties(resource, updates)
+        props = apply_updates(props, updates)
+        if props:
+            try:
+                os.setxattr(path, self.attribute, serialize_properties(props))
+            except OSError as e:
+                if e.errno not in XATTR_FULL_ERRNOS:
+                    raise
+                raise ResponseException(HttpResponseInsufficientStorage('Dead properties are too large.'))
+            return
+        try:
+            os.removexattr(path, self.attribute)
+        except OSError as e:
+            if e.errno != ENODATA:
+                raise
+
+    def delete(self, resource):
+        self.fallback.delete(resource)
+
+    def copy(self, resource, destination):
+        src, dst = resource.get_abs_path(), destination.get_abs_path()
+        copy_xattrs(src, dst, self.attribute)
+        for directory, dirs, files in os.walk(src):
+            target = os.path.join(dst, os.path.relpath(directory, src))
+            for name in dirs + files:
+                if os.path.lexists(os.path.join(target, name)):
+                    copy_xattrs(os.path.join(directory, name), os.path.join(target, name), self.attribute)
+        self.fallback.copy(resource, destination)
+
+    def move(self, resource, destination):
+        self.fallback.move(resource, destination)
@@ -25,17 +25,23 @@ import hashlib
 import mimetypes
 import os
 import datetime
+import errno
 import shutil
+import stat
+import tempfile
 import urllib.request, urllib.parse, urllib.error
 from builtins import str
+from functools import partial
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.utils.http import http_date
 from django.conf import settings
+from django.utils.functional import cached_property
 
 from djangodav.base.resources import BaseDavResource
+from djangodav.fs.utils import UMASK, ThreadPoolExecutor, TreeExecutor, copy_file, copy_tree, copy_xattrs, scandir
 from djangodav.responses import ResponseException
-from djangodav.utils import safe_join, url_join
+from djangodav.utils import safe_join, url_join, iter_file
 
 class BaseFSDavResource(BaseDavResource):
     """Implements an interface to the file system. This can be subclassed to provide
@@ -44,82 +50,294 @@ class BaseFSDavResource(BaseDavResource):
 
     root = settings.MEDIA_ROOT
 
+    upload_chunk_size = 64 * 1024
+    upload_fsync = False
+    upload_file_mode = None  # Mode of uploaded files, 0o666 masked by the process umask by default
+    upload_prefix = '.~davupload.'  # Reserved for temporary files of uploads, see write_stream
+    preserve_metadata = False
+    copy_chunk_size = 1024 * 1024
+    tree_workers = 0
+
+    def __init__(self, path, **kwargs):
+        if 'stat' in kwargs:  # Accepting ready stat result to reduce syscalls
+            self.__dict__['stat'] = kwargs.pop('stat')
+        super(BaseFSDavResource, self).__init__(path, **kwargs)
+
     def get_abs_path(self):
         """Return the absolute path of the resource. Used internally to interface with
         an actual file system. If you override all other methods, this one will not
         be used."""
         return str(os.path.join(os.path.abspath(self.root), *self.path))
 
+    @cached_property
+    def stat(self):
+        """Return os.stat result for the resource or None if it doesn't exist. All the metadata is
+        derived from it, so a resource costs one stat call. The result is cached, invalidate_stat
+        has to be called after the resource is changed on the file system."""
+        try:
+            return os.stat(self.get_abs_path())
+        except OSError:
+            return None
+
+    def invalidate_stat(self):
+        self.__dict__.pop('stat', None)
+
     @property
     def getcontentlength(self):
         """Return the size of the resource in bytes."""
-        return os.path.getsize(self.get_abs_path())
+        return self.stat.st_size
 
     def get_created(self):
         """Return the create time as datetime object."""
-        return datetime.datetime.fromtimestamp(os.stat(self.get_abs_path()).st_ctime)
+        return datetime.datetime.fromtimestamp(self.stat.st_ctime)
 
     def get_modified(self):
         """Return the modified time as datetime object."""
-        return datetime.datetime.fromtimestamp(os.stat(self.get_abs_path()).st_mtime)
+        return datetime.datetime.fromtimestamp(self.stat.st_mtime)
+
+    def get_mtime_stamp(self):
+        """Return the modified time as unix timestamp."""
+        return self.stat.st_mtime
 
     @property
     def is_collection(self):
         """Return True if this resource is a directory (collection in WebDAV parlance)."""
-        return os.path.isdir(self.get_abs_path())
+        return self.stat is not None and stat.S_ISDIR(self.stat.st_mode)
 
     @property
     def is_object(self):
         """Return True if this resource is a file (resource in WebDAV parlance)."""
-        return os.path.isfile(self.get_abs_path())
+        return self.stat is not None and stat.S_ISREG(self.stat.st_mode)
 
     @property
     def exists(self):
         """Return True if this resource exists."""
-        return os.path.exists(self.get_abs_path())
+        return self.stat is not None
+
+    def is_upload(self, name):
+        """Tell whether name is reserved for temporary files of uploads, see write_stream."""
+        return name.startswith(self.upload_prefix)
 
     def get_children(self):
-        """Return an iterator of all direct children of this resource."""
-        for child in os.listdir(self.get_abs_path()):
-            assert isinstance(child, str)
-            yield self.clone(url_join(*(self.path + [child])))
+        """Return an iterator of all direct children of this resource. Directory is read with scandir
+        and children receive their stat result, so they don't have to look themselves up again.
+        Temporary files of uploads in progress are skipped."""
+        if scandir is None:
+            for child in os.listdir(self.get_abs_path()):
+                assert isinstance(child, str)
+                if not self.is_upload(child):
+                    yield self.clone(url_join(*(self.path + [child])))
+            return
+        entries = scandir(self.get_abs_path())
+        try:
+            for entry in entries:
+                if self.is_upload(entry.name):
+                    continue
+                try:
+                    entry_stat = entry.stat()
+                except OSError:  # Removed while listing
+                    continue
+                yield self.clone(url_join(*(self.path + [entry.name])), stat=entry_stat)
+        finally:
+            if hasattr(entries, 'close'):
+                entries.close()
 
     def write(self, content):
         raise NotImplementedError
 
+    def write_stream(self, stream, length=None):
+        """Copy stream to the resource by upload_chunk_size chunks. Data goes to a temporary file in
+        the same directory which is renamed over the resource when complete, so readers never see a
+        partially written file. If length is given and the number of received bytes differs, the
+        upload is discarded. Names starting with upload_prefix are reserved for the temporary files and
+        refused. Return the number of written bytes."""
+        path = self.get_abs_path()
+        directory, name = os.path.split(path)
+        if self.is_upload(name):
+            raise ResponseException(HttpResponseForbidden('Names starting with %s are reserved.' % self.upload_prefix))
+        if self.exists:
+            mode = stat.S_IMODE(self.stat.st_mode)
+        else:
+            mode = 0o666 & ~UMASK if self.upload_file_mode is None else self.upload_file_mode
+        fd, temp_path = tempfile.mkstemp(prefix=self.upload_prefix, dir=directory)
+        try:
+            size = 0
+            with os.fdopen(fd, 'wb') as dst:
+                while True:
+                    chunk = stream.read(self.upload_chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    size += len(chunk)
+                if length is not None and size != length:
+                    raise ResponseException(HttpResponseBadRequest(
+                        'Received %d bytes while Content-Length is %d' % (size, length)
+                    ))
+                if self.upload_fsync:
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            os.chmod(temp_path, mode)
+            if self.exists:  # Keep dead properties stored in extended attributes
+                copy_xattrs(path, temp_path)
+            os.rename(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.invalidate_stat()
+        if self.upload_fsync:
+            self.fsync_directory(directory)
+        return size
+
+    def fsync_directory(self, directory):
+        """Flush directory entry changes (like a rename) to disk, where the platform supports it."""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
     def read(self):
         raise NotImplementedError
 
+    def get_tree_executor(self):
+        """Return TreeExecutor running file operations of collection delete and copy in tree_workers
+        threads, None when they run serially (tree_workers is 0 or concurrent.futures is missing)."""
+        if self.tree_workers and ThreadPoolExecutor is not None:
+            return TreeExecutor(self.tree_workers)
+
+    def get_tree_errors(self, errors):
+        """Turn (absolute path, exception) errors of TreeExecutor into (resource, exception)."""
+        root = os.path.abspath(self.root)
+        return [
+            (self.clone(url_join(*os.path.relpath(path, root).split(os.sep))), error)
+            for path, error in errors
+        ]
+
     def delete(self):
-        """Delete the resource, recursive is implied."""
+        """Delete the resource, recursive is implied. With a tree executor, return the list of
+        (resource, exception) which could not be deleted."""
+        executor = self.get_tree_executor() if self.is_collection else None
+        if executor is not None:
+            errors = executor.delete_tree(self.get_abs_path())
+            self.invalidate_stat()
+            return self.get_tree_errors(errors)
         if self.is_collection:
             for child in self.get_children():
                 child.delete()
+            for name in os.listdir(self.get_abs_path()):  # Left behind by interrupted uploads
+                if self.is_upload(name):
+                    os.remove(os.path.join(self.get_abs_path(), name))
             os.rmdir(self.get_abs_path())
         elif self.is_object:
             os.remove(self.get_abs_path())
+        self.invalidate_stat()
 
     def create_collection(self):
         """Create a directory in the location of this resource."""
         os.mkdir(self.get_abs_path())
+        self.invalidate_stat()
+
+    def copy_file(self, src, dst, preserve_metadata=None):
+        """Copy file src to dst with the cheapest strategy of fs.utils.copy_file, then its mode, or
+        mode and times when preserve_metadata (by default the class attribute) is set. Return the
+        name of the strategy used."""
+        strategy = copy_file(src, dst, self.copy_chunk_size)
+        if self.preserve_metadata if preserve_metadata is None else preserve_metadata:
+            shutil.copystat(src, dst)
+        else:
+            shutil.copymode(src, dst)
+        return strategy
 
     def copy_object(self, destination, depth=0):
-        shutil.copy(self.get_abs_path(), destination.get_abs_path())
+        """Copy the file, return the copy strategy used."""
+        strategy = self.copy_file(self.get_abs_path(), destination.get_abs_path())
+        destination.invalidate_stat()
+        return strategy
+
+    def copy_collection(self, destination, depth=-1):
+        """Copy the directory tree with copy_tree instead of a resource per entry. Mode and times
+        are copied too when preserve_metadata is set. With a tree executor, return the list of
+        (resource, exception) which could not be copied."""
+        executor = self.get_tree_executor()
+        if executor is not None:
+            errors = executor.copy_tree(self.get_abs_path(), destination.get_abs_path(), depth,
+                                        self.copy_file, self.preserve_metadata)
+            destination.invalidate_stat()
+            return self.get_tree_errors(errors)
+        copy_tree(self.get_abs_path(), destination.get_abs_path(), depth,
+                  self.copy_file, self.preserve_metadata)
+        destination.invalidate_stat()
 
     def move_object(self, destination):
-        os.rename(self.get_abs_path(), destination.get_abs_path())
+        try:
+            os.rename(self.get_abs_path(), destination.get_abs_path())
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            self.copy_file(self.get_abs_path(), destination.get_abs_path(), preserve_metadata=True)
+            os.remove(self.get_abs_path())
+        self.invalidate_stat()
+        destination.invalidate_stat()
+
+    def move(self, destination):
+        """A directory moved to a free destination is renamed at once. Across file systems it is
+        copied with its metadata and deleted."""
+        if not self.is_collection or destination.exists:
+            return super(BaseFSDavResource, self).move(destination)
+        try:
+            os.rename(self.get_abs_path(), destination.get_abs_path())
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            destination.create_collection()
+            copy_tree(self.get_abs_path(), destination.get_abs_path(),
+                      copy_function=partial(self.copy_file, preserve_metadata=True), preserve_metadata=True)
+            shutil.copystat(self.get_abs_path(), destination.get_abs_path())
+            self.delete()
+        self.invalidate_stat()
+        destination.invalidate_stat()
+
+
+class StatEtagMixIn(object):
+    @property
+    def getetag(self):
+        """Build the etag from inode, size and modification time (in nanoseconds) of the cached stat
+        result. No extra syscalls nor hashing, and the same value in every worker process."""
+        mtime = getattr(self.stat, 'st_mtime_ns', None)
+        if mtime is None:
+            mtime = int(self.stat.st_mtime * 1000000000)
+        return '%x-%x-%x' % (self.stat.st_ino, self.stat.st_size, mtime)
 
 
 class DummyReadFSDavResource(BaseFSDavResource):
     def read(self):
-        with open(self.get_abs_path(), 'r') as f:
-            return f.read()
+        """Return the opened file, the view streams it to the client in chunks."""
+        return open(self.get_abs_path(), 'rb')
+
+    def read_range(self, start, end):
+        """Seek the file to start and stream the range from there."""
+        f = open(self.get_abs_path(), 'rb')
+        f.seek(start)
+        return iter_file(f, self.read_chunk_size, end - start + 1)
 
 
 class DummyWriteFSDavResource(BaseFSDavResource):
     def write(self, request):
-        with file(self.get_abs_path(), 'w') as dst:
-            shutil.copyfileobj(request, dst)
+        """Stream request body to the file, validating it against Content-Length."""
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0) or None
+        except ValueError:
+            length = None
+        return self.write_stream(request, length)
 
 
 class DummyFSDAVResource(DummyReadFSDavResource, DummyWriteFSDavResource, BaseFSDavResource):
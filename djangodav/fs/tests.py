@@ -19,9 +19,20 @@ from __future__ import unicode_literals
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from stat import S_IFDIR, S_IFREG, S_IMODE
+
 from django.test import TestCase
-from djangodav.fs.resources import BaseFSDavResource
-from mock import patch
+from lxml import etree
+from djangodav.fs.properties import XattrPropertyStore
+from djangodav.fs.resources import BaseFSDavResource, DummyFSDAVResource, StatEtagMixIn
+from djangodav.fs.utils import COPY_STRATEGIES, UMASK
+from djangodav.responses import ResponseException
+from mock import patch, Mock
 
 
 class TestFSDavResource(TestCase):
@@ -32,37 +43,329 @@ class TestFSDavResource(TestCase):
     def setUp(self):
         self.resource = self.FSDavResource("/path/to/name")
 
-    @patch('djangodav.fs.resources.os.path.isdir')
-    def test_is_collection(self, isdir):
-        isdir.return_value = True
+    @patch('djangodav.fs.resources.os.stat')
+    def test_is_collection(self, stat):
+        stat.return_value = Mock(st_mode=S_IFDIR | 0o755)
         self.assertTrue(self.resource.is_collection)
-        isdir.assert_called_with('/some/folder/path/to/name')
+        self.assertFalse(self.resource.is_object)
+        stat.assert_called_with('/some/folder/path/to/name')
 
-    @patch('djangodav.fs.resources.os.path.isfile')
-    def test_isfile(self, isfile):
-        isfile.return_value = True
+    @patch('djangodav.fs.resources.os.stat')
+    def test_isfile(self, stat):
+        stat.return_value = Mock(st_mode=S_IFREG | 0o644)
         self.assertTrue(self.resource.is_object)
-        isfile.assert_called_with('/some/folder/path/to/name')
+        self.assertFalse(self.resource.is_collection)
+        stat.assert_called_with('/some/folder/path/to/name')
 
-    @patch('djangodav.fs.resources.os.path.exists')
-    def test_isexists(self, exists):
-        exists.return_value = True
+    @patch('djangodav.fs.resources.os.stat')
+    def test_isexists(self, stat):
+        stat.return_value = Mock(st_mode=S_IFREG | 0o644)
         self.assertTrue(self.resource.exists)
-        exists.assert_called_with('/some/folder/path/to/name')
+        stat.assert_called_with('/some/folder/path/to/name')
+
+    @patch('djangodav.fs.resources.os.stat')
+    def test_missing(self, stat):
+        stat.side_effect = OSError()
+        self.assertFalse(self.resource.exists)
+        self.assertFalse(self.resource.is_collection)
+        self.assertFalse(self.resource.is_object)
 
-    @patch('djangodav.fs.resources.os.path.getsize')
-    def test_get_size(self, getsize):
-        getsize.return_value = 42
+    @patch('djangodav.fs.resources.os.stat')
+    def test_get_size(self, stat):
+        stat.return_value = Mock(st_mode=S_IFREG | 0o644, st_size=42)
         self.assertEquals(self.resource.getcontentlength, 42)
-        getsize.assert_called_with('/some/folder/path/to/name')
+        stat.assert_called_with('/some/folder/path/to/name')
+
+    @patch('djangodav.fs.resources.os.stat')
+    def test_stat_cache(self, stat):
+        stat.return_value = Mock(st_mode=S_IFREG | 0o644, st_size=42, st_ctime=0, st_mtime=0)
+        self.resource.exists, self.resource.is_object, self.resource.getcontentlength
+        self.resource.get_created(), self.resource.get_modified()
+        self.assertEqual(stat.call_count, 1)
+        self.resource.invalidate_stat()
+        self.resource.exists
+        self.assertEqual(stat.call_count, 2)
+
+    @patch('djangodav.fs.resources.os.stat')
+    def test_stat_etag(self, stat):
+        class EtagResource(StatEtagMixIn, self.FSDavResource):
+            pass
+        stat.return_value = Mock(st_ino=0x1234, st_size=42, st_mtime_ns=1500000000123456789)
+        self.assertEqual(EtagResource("/path/to/name").getetag, '1234-2a-14d1120d8271cd15')
+        self.assertEqual(stat.call_count, 1)
 
     def test_get_abs_path(self):
         self.assertEquals(self.resource.get_abs_path(), '/some/folder/path/to/name')
 
+    @patch('djangodav.fs.resources.os.stat')
+    @patch('djangodav.fs.resources.scandir')
+    def test_get_children(self, scandir, stat):
+        child_stats = [Mock(st_mode=S_IFREG | 0o644), Mock(st_mode=S_IFDIR | 0o755)]
+        scandir.return_value = [
+            Mock(stat=Mock(return_value=child_stats[0])),
+            Mock(stat=Mock(return_value=child_stats[1])),
+        ]
+        scandir.return_value[0].name = 'child1'
+        scandir.return_value[1].name = 'child2'
+        children = list(self.resource.get_children())
+        self.assertEqual(children[0].path, ['path', 'to', 'name', 'child1'])
+        self.assertEqual(children[1].path, ['path', 'to', 'name', 'child2'])
+        self.assertTrue(children[0].is_object)
+        self.assertTrue(children[1].is_collection)
+        scandir.assert_called_with('/some/folder/path/to/name')
+        self.assertFalse(stat.called)
+
+    @patch('djangodav.fs.resources.scandir', None)
     @patch('djangodav.fs.resources.os.listdir')
-    def test_get_children(self, listdir):
+    def test_get_children_listdir(self, listdir):
         listdir.return_value=['child1', 'child2']
         children = list(self.resource.get_children())
         self.assertEqual(children[0].path, ['path', 'to', 'name', 'child1'])
         self.assertEqual(children[1].path, ['path', 'to', 'name', 'child2'])
         listdir.assert_called_with('/some/folder/path/to/name')
+
+    @patch('djangodav.fs.resources.scandir', None)
+    @patch('djangodav.fs.resources.os.listdir')
+    def test_get_children_uploads(self, listdir):
+        listdir.return_value = ['.~davupload.x1y2', '.child', '.child.x1y2.upload']
+        self.assertEqual([child.path[-1] for child in self.resource.get_children()], ['.child', '.child.x1y2.upload'])
+
+
+class TestDummyFSDavResource(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        class FSDavResource(DummyFSDAVResource):
+            root = self.root
+        self.resource_class = FSDavResource
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_read(self):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'\x00\xff' * 10)
+        content = self.resource_class('/file.bin').read()
+        try:
+            self.assertEqual(content.read(), b'\x00\xff' * 10)
+        finally:
+            content.close()
+
+    def test_read_range(self):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'0123456789')
+        self.assertEqual(b''.join(self.resource_class('/file.bin').read_range(3, 6)), b'3456')
+
+    def test_write(self):
+        request = Mock(META={'CONTENT_LENGTH': '6'}, read=BytesIO(b'\x00data\xff').read)
+        self.assertEqual(self.resource_class('/file.bin').write(request), 6)
+        self.assertEqual(os.listdir(self.root), ['file.bin'])
+        with open(os.path.join(self.root, 'file.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'\x00data\xff')
+
+    def test_write_hidden(self):
+        def read(size):
+            self.assertEqual([child.path for child in self.resource_class('/').get_children()], [])
+            self.assertEqual(len(os.listdir(self.root)), 1)
+            return b''
+        self.assertEqual(self.resource_class('/file.bin').write(Mock(META={}, read=read)), 0)
+        self.assertEqual([child.path for child in self.resource_class('/').get_children()], [['file.bin']])
+
+    def test_write_mode(self):
+        request = Mock(META={'CONTENT_LENGTH': '4'}, read=BytesIO(b'data').read)
+        name = 'x' * 250
+        self.resource_class('/' + name).write(request)
+        self.assertEqual(S_IMODE(os.stat(os.path.join(self.root, name)).st_mode), 0o666 & ~UMASK)
+
+    def test_write_reserved(self):
+        request = Mock(META={'CONTENT_LENGTH': '4'}, read=BytesIO(b'data').read)
+        with self.assertRaises(ResponseException) as context:
+            self.resource_class('/.~davupload.x').write(request)
+        self.assertEqual(context.exception.response.status_code, 403)
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_delete_uploads(self):
+        os.makedirs(os.path.join(self.root, 'dir'))
+        for name in ('.~davupload.x1y2', '.file.upload'):
+            open(os.path.join(self.root, 'dir', name), 'wb').close()
+        self.assertEqual([child.path for child in self.resource_class('/dir/').get_children()],
+                         [['dir', '.file.upload']])
+        self.resource_class('/dir/').delete()
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_write_truncated(self):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'old')
+        request = Mock(META={'CONTENT_LENGTH': '10'}, read=BytesIO(b'short').read)
+        self.assertRaises(ResponseException, self.resource_class('/file.bin').write, request)
+        self.assertEqual(os.listdir(self.root), ['file.bin'])
+        with open(os.path.join(self.root, 'file.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+
+    def make_tree(self):
+        os.makedirs(os.path.join(self.root, 'src', 'sub'))
+        for name in ('src/a.txt', 'src/sub/b.txt'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(name.encode('utf-8'))
+
+    def test_move_collection(self):
+        self.make_tree()
+        src = self.resource_class('/src/')
+        with patch('djangodav.fs.resources.os.rename', wraps=os.rename) as rename:
+            src.move(self.resource_class('/dst/'))
+        self.assertEqual(rename.call_count, 1)
+        self.assertFalse(src.exists)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'dst'))), ['a.txt', 'sub'])
+        self.assertTrue(self.resource_class('/dst/sub/b.txt').is_object)
+
+    def test_copy_collection(self):
+        self.make_tree()
+        os.utime(os.path.join(self.root, 'src', 'a.txt'), (1000000000, 1000000000))
+        self.resource_class.preserve_metadata = True
+        self.resource_class('/src/').copy(self.resource_class('/dst/'))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'dst'))), ['a.txt', 'sub'])
+        with open(os.path.join(self.root, 'dst', 'sub', 'b.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'src/sub/b.txt')
+        self.assertEqual(self.resource_class('/dst/a.txt').get_mtime_stamp(), 1000000000)
+        self.assertTrue(self.resource_class('/src/sub/b.txt').exists)
+
+    def test_copy_collection_depth(self):
+        self.make_tree()
+        self.resource_class('/src/').copy(self.resource_class('/dst/'), depth=1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'dst'))), ['a.txt', 'sub'])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'dst', 'sub')), [])
+
+    def test_move_collection_cross_device(self):
+        self.make_tree()
+        src = self.resource_class('/src/')
+        with patch('djangodav.fs.resources.os.rename', side_effect=OSError(errno.EXDEV, 'Cross-device link')):
+            src.move(self.resource_class('/dst/'))
+        self.assertFalse(src.exists)
+        self.assertTrue(self.resource_class('/dst/sub/b.txt').is_object)
+
+    def test_copy_object(self):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'\x00\xff' * 100000)
+        strategy = self.resource_class('/file.bin').copy_object(self.resource_class('/copy.bin'))
+        self.assertIn(strategy, [name for name, _ in COPY_STRATEGIES])
+        with open(os.path.join(self.root, 'copy.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'\x00\xff' * 100000)
+
+    @patch('djangodav.fs.utils.fcntl', None)
+    @patch('djangodav.fs.utils.os.copy_file_range', create=True,
+           side_effect=OSError(errno.EXDEV, 'Cross-device link'))
+    @patch('djangodav.fs.utils.os.sendfile', create=True, side_effect=OSError(errno.ENOSYS, 'Not implemented'))
+    def test_copy_object_userspace(self, sendfile, copy_file_range):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'data')
+        strategy = self.resource_class('/file.bin').copy_object(self.resource_class('/copy.bin'))
+        self.assertEqual(strategy, 'userspace')
+        with open(os.path.join(self.root, 'copy.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'data')
+
+    @patch('djangodav.fs.utils.fcntl', None)
+    @patch('djangodav.fs.utils.os.copy_file_range', create=True, return_value=0)
+    def test_copy_object_short_copy(self, copy_file_range):
+        with open(os.path.join(self.root, 'file.bin'), 'wb') as f:
+            f.write(b'data' * 1000)
+        strategy = self.resource_class('/file.bin').copy_object(self.resource_class('/copy.bin'))
+        self.assertTrue(copy_file_range.called)
+        self.assertIn(strategy, ('sendfile', 'userspace'))
+        with open(os.path.join(self.root, 'copy.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'data' * 1000)
+
+    def test_delete_parallel(self):
+        self.make_tree()
+        self.resource_class.tree_workers = 4
+        self.assertEqual(self.resource_class('/src/').delete(), [])
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_delete_parallel_errors(self):
+        self.make_tree()
+        self.resource_class.tree_workers = 4
+        failing = os.path.join(self.root, 'src', 'sub', 'b.txt')
+
+        def remove(path):
+            if path == failing:
+                raise OSError(errno.EACCES, 'Permission denied')
+            os.unlink(path)
+        with patch('djangodav.fs.utils.os.remove', side_effect=remove):
+            errors = self.resource_class('/src/').delete()
+        self.assertEqual([(resource.path, error.errno) for resource, error in errors],
+                         [(['src', 'sub', 'b.txt'], errno.EACCES)])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'src')), ['sub'])
+
+    def test_copy_parallel(self):
+        self.make_tree()
+        self.resource_class.tree_workers = 4
+        self.assertEqual(self.resource_class('/src/').copy(self.resource_class('/dst/')), [])
+        with open(os.path.join(self.root, 'dst', 'sub', 'b.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'src/sub/b.txt')
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, 'dst'))), ['a.txt', 'sub'])
+
+
+class TestXattrPropertyStore(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.sidecar_root = tempfile.mkdtemp()
+
+        class FSDavResource(DummyFSDAVResource):
+            root = self.root
+
+        class PropertyStore(XattrPropertyStore):
+            sidecar_root = self.sidecar_root
+        self.resource_class = FSDavResource
+        self.store = PropertyStore()
+        os.makedirs(os.path.join(self.root, 'src', 'sub'))
+        with open(os.path.join(self.root, 'src', 'sub', 'file'), 'wb') as f:
+            f.write(b'data')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.sidecar_root)
+
+    def set_color(self, path, color):
+        self.store.set_properties(self.resource_class(path), [('{urn:x}color', etree.fromstring(
+            '<color xmlns="urn:x">%s</color>' % color))])
+
+    def get_colors(self, *paths):
+        return [props['{urn:x}color'].text if props else None
+                for props in self.store.get_properties([self.resource_class(path) for path in paths])]
+
+    def test_properties(self):
+        if not hasattr(os, 'getxattr') or self.store.read(self.root) is None:
+            self.skipTest('No extended attributes support')
+        self.set_color('/src/', 'red')
+        self.set_color('/src/sub/file', 'blue')
+        self.assertEqual(self.get_colors('/src/', '/src/sub/', '/src/sub/file'), ['red', None, 'blue'])
+        self.assertEqual(os.listdir(self.sidecar_root), [])
+
+        request = Mock(META={'CONTENT_LENGTH': '3'}, read=BytesIO(b'new').read)
+        self.resource_class('/src/sub/file').write(request)
+        self.resource_class('/src/').copy(self.resource_class('/dst/'))
+        self.store.copy(self.resource_class('/src/'), self.resource_class('/dst/'))
+        self.assertEqual(self.get_colors('/dst/', '/dst/sub/file'), ['red', 'blue'])
+
+        self.resource_class('/dst/').move(self.resource_class('/moved/'))
+        self.store.set_properties(self.resource_class('/moved/'), [('{urn:x}color', None)])
+        self.assertEqual(self.get_colors('/moved/', '/moved/sub/file'), [None, 'blue'])
+
+    @patch('djangodav.fs.properties.os.getxattr', create=True, side_effect=OSError(errno.ENODATA, 'No data'))
+    def test_properties_too_large(self, getxattr):
+        for error in (errno.E2BIG, errno.ENOSPC):
+            with patch('djangodav.fs.properties.os.setxattr', create=True, side_effect=OSError(error, 'Too large')):
+                with self.assertRaises(ResponseException) as context:
+                    self.set_color('/src/sub/file', 'blue' * 65536)
+            self.assertEqual(context.exception.response.status_code, 507)
+        with patch('djangodav.fs.properties.os.setxattr', create=True, side_effect=OSError(errno.EPERM, 'Denied')):
+            self.assertRaises(OSError, self.set_color, '/src/sub/file', 'blue')
+
+    @patch('djangodav.fs.properties.os.getxattr', create=True, side_effect=OSError(errno.ENOTSUP, 'Not supported'))
+    def test_sidecar_fallback(self, getxattr):
+        self.set_color('/src/sub/file', 'blue')
+        self.assertEqual(self.get_colors('/src/', '/src/sub/file'), [None, 'blue'])
+        self.assertEqual(getxattr.call_count, 2)
+        self.store.move(self.resource_class('/src/'), self.resource_class('/dst/'))
+        self.assertEqual(self.get_colors('/src/sub/file', '/dst/sub/file'), [None, 'blue'])
+        self.store.delete(self.resource_class('/dst/'))
+        self.assertEqual(os.listdir(self.sidecar_root), [])
@@ -0,0 +1,306 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+import os
+import shutil
+import sys
+
+from builtins import object
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # Python 2 without futures backport
+    ThreadPoolExecutor = None
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+FICLONE = 0x40049409  # Linux ioctl sharing data blocks of two files, from linux/fs.h
+
+# File mode creation mask of the process, read once as it can only be queried by setting it
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+# Errors telling that a copy strategy is not supported for the given files, next one is tried
+COPY_FALLBACK_ERRNOS = set(getattr(errno, name) for name in (
+    'EXDEV', 'EINVAL', 'ENOSYS', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTTY', 'EBADF', 'ENOTSOCK'
+) if hasattr(errno, name))
+
+# Errors telling that a file system has no extended attributes
+XATTR_UNSUPPORTED_ERRNOS = set(getattr(errno, name) for name in (
+    'EOPNOTSUPP', 'ENOTSUP', 'ENOSYS'
+) if hasattr(errno, name))
+
+
+def reflink(src_fd, dst_fd, size, chunk_size):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def kernel_copy(src_fd, dst_fd, size, chunk_size):
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(size - offset, chunk_size), offset, offset)
+        if not copied:  # Some file systems report nothing copied instead of an error
+            return False
+        offset += copied
+
+
+def sendfile(src_fd, dst_fd, size, chunk_size):
+    if not hasattr(os, 'sendfile'):
+        return False
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(size - offset, chunk_size))
+        if not sent:
+            return False
+        offset += sent
+
+
+def userspace_copy(src_fd, dst_fd, size, chunk_size):
+    while True:
+        chunk = os.read(src_fd, chunk_size)
+        if not chunk:
+            break
+        while chunk:
+            chunk = chunk[os.write(dst_fd, chunk):]
+
+
+COPY_STRATEGIES = (
+    ('reflink', reflink),
+    ('copy_file_range', kernel_copy),
+    ('sendfile', sendfile),
+    ('userspace', userspace_copy),
+)
+
+
+def copy_file(src, dst, chunk_size=1024 * 1024):
+    """Copy contents of file src to dst, which is created or truncated. Strategies of COPY_STRATEGIES
+    are tried in order, so data is shared by a reflink or copied by the kernel where the platform and
+    file systems support it, and only goes through userspace buffers otherwise. A strategy failing
+    with one of COPY_FALLBACK_ERRNOS or returning False (unsupported or stopped short) hands over to
+    the next one. Return the name of the strategy used."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.Error('%r and %r are the same file' % (src, dst))
+    binary = getattr(os, 'O_BINARY', 0)
+    src_fd = os.open(src, os.O_RDONLY | binary)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | binary, 0o666)
+        try:
+            size = os.fstat(src_fd).st_size
+            for name, strategy in COPY_STRATEGIES:
+                try:
+                    if strategy(src_fd, dst_fd, size, chunk_size) is not False:
+                        return name
+                except OSError as e:
+                    if e.errno not in COPY_FALLBACK_ERRNOS:
+                        raise
+                # Start over, the failed strategy may have copied a part
+                os.ftruncate(dst_fd, 0)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+                os.lseek(src_fd, 0, os.SEEK_SET)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def copy_xattrs(src, dst, prefix='user.'):
+    """Copy extended attributes named with prefix from src to dst. Does nothing where the platform
+    or one of the file systems has no extended attributes."""
+    if not hasattr(os, 'listxattr'):
+        return
+    try:
+        for name in os.listxattr(src):
+            if name.startswith(prefix):
+                os.setxattr(dst, name, os.getxattr(src, name))
+    except OSError as e:
+        if e.errno not in XATTR_UNSUPPORTED_ERRNOS:
+            raise
+
+
+def iter_entries(path, follow_symlinks=True):
+    """Yield (name, is_dir) for the entries of directory path, from scandir when available."""
+    if scandir is None:
+        for name in os.listdir(path):
+            entry_path = os.path.join(path, name)
+            yield name, os.path.isdir(entry_path) and (follow_symlinks or not os.path.islink(entry_path))
+        return
+    entries = scandir(path)
+    try:
+        for entry in entries:
+            try:
+                yield entry.name, entry.is_dir(follow_symlinks=follow_symlinks)
+            except OSError:  # Removed while listing
+                continue
+    finally:
+        if hasattr(entries, 'close'):
+            entries.close()
+
+
+def remove_path(path):
+    """Remove file or directory tree at path."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def copy_tree(src, dst, depth=-1, copy_function=shutil.copy, preserve_metadata=False):
+    """Copy the contents of directory src into the existing directory dst, depth levels deep (-1 is
+    infinity). Files are copied with copy_function, entries of dst in the way of an entry of another
+    type are replaced. With preserve_metadata directories get the mode and times of their source
+    once their contents are copied."""
+    if depth == 0:
+        return
+    for name, is_dir in iter_entries(src):
+        src_path, dst_path = os.path.join(src, name), os.path.join(dst, name)
+        if is_dir:
+            if os.path.lexists(dst_path) and not os.path.isdir(dst_path):
+                remove_path(dst_path)
+            if not os.path.isdir(dst_path):
+                os.mkdir(dst_path)
+            copy_tree(src_path, dst_path, depth - 1, copy_function, preserve_metadata)
+            if preserve_metadata:
+                shutil.copystat(src_path, dst_path)
+        else:
+            if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+                shutil.rmtree(dst_path)
+            copy_function(src_path, dst_path)
+
+
+class TreeExecutor(object):
+    """Runs leaf operations on a directory tree, file unlinks and copies, in a pool of workers
+    threads. Directory operations stay ordered and serial: directories are created before files are
+    copied into them and removed after their contents. Failures don't stop the operation, they are
+    returned as a list of (path, exception), paths depending on a failed one are skipped."""
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def walk(self, path, depth=-1, follow_symlinks=True):
+        """Return (directories, files, errors) under path, depth levels deep. Directories come after
+        their parents."""
+        directories, files, errors = [], [], []
+        stack = [(path, depth)]
+        while stack:
+            current, level = stack.pop()
+            if level == 0:
+                continue
+            try:
+                entries = list(iter_entries(current, follow_symlinks))
+            except OSError as e:
+                errors.append((current, e))
+                continue
+            for name, is_dir in entries:
+                entry_path = os.path.join(current, name)
+                if is_dir:
+                    directories.append(entry_path)
+                    stack.append((entry_path, level - 1))
+                else:
+                    files.append(entry_path)
+        return directories, files, errors
+
+    def run(self, function, calls):
+        """Call function with each of the (path, args) calls in the pool, return the failed calls as
+        (path, exception)."""
+        errors = []
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = [(path, executor.submit(function, *args)) for path, args in calls]
+            for path, future in futures:
+                if future.exception() is not None:
+                    errors.append((path, future.exception()))
+        return errors
+
+    def delete_tree(self, path):
+        """Delete directory path with its contents. Symbolic links are removed, not followed."""
+        directories, files, errors = self.walk(path, follow_symlinks=False)
+        errors += self.run(os.remove, [(file_path, (file_path,)) for file_path in files])
+        failed = set(os.path.dirname(failed_path) for failed_path, error in errors)
+        failed.update(failed_path for failed_path, error in errors)
+        for directory in reversed([path] + directories):
+            if directory in failed:
+                failed.add(os.path.dirname(directory))
+                continue
+            try:
+                os.rmdir(directory)
+            except OSError as e:
+                errors.append((directory, e))
+                failed.add(os.path.dirname(directory))
+        return errors
+
+    def copy_tree(self, src, dst, depth=-1, copy_function=shutil.copy, preserve_metadata=False):
+        """Parallel version of copy_tree, errors are reported for destination paths."""
+        def target(source):
+            return os.path.join(dst, os.path.relpath(source, src))
+
+        directories, files, walk_errors = self.walk(src, depth)
+        errors = [(target(failed_path), error) for failed_path, error in walk_errors]
+        failed = set()
+        for directory in directories:
+            if os.path.dirname(directory) in failed:
+                failed.add(directory)
+                continue
+            try:
+                if os.path.lexists(target(directory)) and not os.path.isdir(target(directory)):
+                    remove_path(target(directory))
+                if not os.path.isdir(target(directory)):
+                    os.mkdir(target(directory))
+            except OSError as e:
+                errors.append((target(directory), e))
+                failed.add(directory)
+
+        calls = []
+        for file_path in files:
+            if os.path.dirname(file_path) in failed:
+                continue
+            try:
+                if os.path.isdir(target(file_path)) and not os.path.islink(target(file_path)):
+                    shutil.rmtree(target(file_path))
+            except OSError as e:
+                errors.append((target(file_path), e))
+                continue
+            calls.append((target(file_path), (file_path, target(file_path))))
+        errors += self.run(copy_function, calls)
+
+        if preserve_metadata:
+            for directory in reversed(directories):
+                if directory not in failed:
+                    try:
+                        shutil.copystat(directory, target(directory))
+                    except OSError as e:
+                        errors.append((target(directory), e))
+        return errors
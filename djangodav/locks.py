@@ -20,9 +20,13 @@ from __future__ import unicode_literals
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 from builtins import str
+from builtins import object
+import heapq
+import threading
+import time
 from uuid import uuid4
 
-from djangodav.base.locks import BaseLock
+from djangodav.base.locks import ActiveLock, BaseLock, normalize_token
 
 
 class DummyLock(BaseLock):
@@ -35,5 +39,163 @@ class DummyLock(BaseLock):
     def release(self, token):
         return True
 
+    def refresh(self, token, timeout):
+        return ActiveLock(normalize_token(token), self.resource.get_path(), 0, 'exclusive', 'write', None, timeout)
+
     def del_locks(self):
         pass
+
+
+class LockNode(object):
+    """Node of LockTable path trie: locks set on the path and lock counters of the whole subtree."""
+    def __init__(self):
+        self.children = {}
+        self.locks = {}
+        self.count = 0
+        self.exclusive_count = 0
+
+
+class LockTable(object):
+    """Thread-safe in process lock storage. Locks are kept in a trie of path names, each node
+    counting the locks of its subtree, so conflicts with ancestors and descendants are found in
+    O(path depth). Expiration times are kept in a min-heap, expired locks are purged in O(log n)
+    each before every operation."""
+
+    def __init__(self):
+        self.mutex = threading.RLock()
+        self.root = LockNode()
+        self.tokens = {}
+        self.expirations = []
+
+    def get_nodes(self, path, create=False):
+        """Return the list of nodes from the root to path, shorter if path has no node."""
+        nodes = [self.root]
+        for name in path:
+            node = nodes[-1].children.get(name)
+            if node is None:
+                if not create:
+                    break
+                node = nodes[-1].children[name] = LockNode()
+            nodes.append(node)
+        return nodes
+
+    def purge(self):
+        current = time.time()
+        while self.expirations and self.expirations[0][0] <= current:
+            expires, token = heapq.heappop(self.expirations)
+            lock = self.tokens.get(token)
+            if lock is not None and lock.expires == expires:  # Refreshed locks leave stale entries
+                self.remove(lock)
+
+    def add(self, lock):
+        for node in self.get_nodes(lock.path, create=True):
+            node.count += 1
+            node.exclusive_count += lock.scope == 'exclusive'
+        node.locks[lock.token] = lock
+        self.tokens[lock.token] = lock
+        heapq.heappush(self.expirations, (lock.expires, lock.token))
+
+    def remove(self, lock):
+        nodes = self.get_nodes(lock.path)
+        del nodes[-1].locks[lock.token]
+        del self.tokens[lock.token]
+        for node in nodes:
+            node.count -= 1
+            node.exclusive_count -= lock.scope == 'exclusive'
+        for parent, name, node in reversed(list(zip(nodes, lock.path, nodes[1:]))):
+            if node.count:
+                break
+            del parent.children[name]
+
+    def get(self, path):
+        """Return locks covering path: set on it or on its ancestors with infinite depth."""
+        nodes = self.get_nodes(path)
+        exact = len(nodes) == len(path) + 1
+        locks = [lock for node in (nodes[:-1] if exact else nodes) for lock in node.locks.values() if lock.depth == -1]
+        if exact:
+            locks.extend(nodes[-1].locks.values())
+        return locks
+
+    def get_subtree(self, path):
+        """Return locks set on path and on its descendants."""
+        nodes = self.get_nodes(path)
+        if len(nodes) != len(path) + 1:
+            return []
+        stack, locks = [nodes[-1]], []
+        while stack:
+            node = stack.pop()
+            locks.extend(node.locks.values())
+            stack.extend(node.children.values())
+        return locks
+
+    def has_conflicts(self, path, depth, scope):
+        nodes = self.get_nodes(path)
+        conflicts = [lock for lock in self.get(path) if scope == 'exclusive' or lock.scope == 'exclusive']
+        if conflicts or depth != -1 or len(nodes) != len(path) + 1:
+            return bool(conflicts)
+        return bool(nodes[-1].count if scope == 'exclusive' else nodes[-1].exclusive_count)
+
+
+class MemoryLock(BaseLock):
+    """Locks stored in memory of the process, for single process deployments and benchmarks. All the
+    instances of a class share its table."""
+
+    table = LockTable()
+    default_timeout = 600
+    max_timeout = 7 * 24 * 3600
+
+    def get_lock(self, token):
+        """Return the lock of the given token if it covers the resource."""
+        lock = self.table.tokens.get(normalize_token(token))
+        if lock is None or self.resource.path[:len(lock.path)] != lock.path:
+            return None
+        if lock.depth != -1 and len(self.resource.path) != len(lock.path):
+            return None
+        return lock
+
+    def get(self):
+        with self.table.mutex:
+            self.table.purge()
+            return self.table.get(self.resource.path)
+
+    def get_descendants(self):
+        with self.table.mutex:
+            self.table.purge()
+            depth = len(self.resource.path)
+            return [lock for lock in self.table.get_subtree(self.resource.path) if len(lock.path) > depth]
+
+    def acquire(self, lockscope, locktype, depth, timeout, owner):
+        depth = 0 if depth == 0 else -1
+        timeout = min(timeout or self.default_timeout, self.max_timeout)
+        with self.table.mutex:
+            self.table.purge()
+            if self.table.has_conflicts(self.resource.path, depth, lockscope):
+                return None
+            lock = ActiveLock(str(uuid4()), list(self.resource.path), depth, lockscope, locktype, owner,
+                              timeout, time.time() + timeout)
+            self.table.add(lock)
+            return lock.token
+
+    def release(self, token):
+        with self.table.mutex:
+            self.table.purge()
+            lock = self.get_lock(token)
+            if lock is None:
+                return False
+            self.table.remove(lock)
+            return True
+
+    def refresh(self, token, timeout):
+        timeout = min(timeout or self.default_timeout, self.max_timeout)
+        with self.table.mutex:
+            self.table.purge()
+            lock = self.get_lock(token)
+            if lock is not None:
+                lock.timeout, lock.expires = timeout, time.time() + timeout
+                heapq.heappush(self.table.expirations, (lock.expires, lock.token))
+            return lock
+
+    def del_locks(self):
+        with self.table.mutex:
+            for lock in self.table.get_subtree(self.resource.path):
+                self.table.remove(lock)
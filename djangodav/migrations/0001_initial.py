@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('path', models.CharField(db_index=True, max_length=512)),
+                ('depth', models.SmallIntegerField(default=-1)),
+                ('scope', models.CharField(max_length=16)),
+                ('type', models.CharField(max_length=16)),
+                ('owner', models.TextField(blank=True, null=True)),
+                ('timeout', models.PositiveIntegerField()),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangodav', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DavProperty',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(db_index=True, max_length=512)),
+                ('name', models.CharField(max_length=255)),
+                ('value', models.TextField()),
+            ],
+            options={
+                'unique_together': {('path', 'name')},
+            },
+        ),
+    ]
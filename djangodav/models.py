@@ -18,3 +18,33 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from builtins import object
+from django.db import models
+
+
+class Lock(models.Model):
+    """Lock stored by djangodav.db.locks.DBLock. Path is the normalized resource path ('/a/b',
+    root is '/'), depth is 0 or -1 for infinity."""
+    token = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=512, db_index=True)
+    depth = models.SmallIntegerField(default=-1)
+    scope = models.CharField(max_length=16)
+    type = models.CharField(max_length=16)
+    owner = models.TextField(blank=True, null=True)
+    timeout = models.PositiveIntegerField()
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta(object):
+        app_label = 'djangodav'
+
+
+class DavProperty(models.Model):
+    """Dead property stored by djangodav.db.properties.DBPropertyStore. Name is the clark name of
+    the property, value the serialized property element."""
+    path = models.CharField(max_length=512, db_index=True)
+    name = models.CharField(max_length=255)
+    value = models.TextField()
+
+    class Meta(object):
+        app_label = 'djangodav'
+        unique_together = (('path', 'name'),)
@@ -26,7 +26,7 @@ try:
     import http.client
 except ImportError:
     from http import client as httplib
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 
 # When possible, code returns an HTTPResponse sub-class. In some situations, we want to be able
@@ -56,6 +56,10 @@ class HttpResponseMultiStatus(HttpResponse):
     status_code = http.client.MULTI_STATUS
 
 
+class StreamingHttpResponseMultiStatus(StreamingHttpResponse):
+    status_code = http.client.MULTI_STATUS
+
+
 class HttpResponseNotImplemented(HttpResponse):
     status_code = http.client.NOT_IMPLEMENTED
 
@@ -82,3 +86,15 @@ class HttpResponseLocked(HttpResponse):
 
 class HttpResponseUnAuthorized(HttpResponse):
     status_code = http.client.UNAUTHORIZED
+
+
+class HttpResponseRequestedRangeNotSatisfiable(HttpResponse):
+    status_code = http.client.REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+class HttpResponseInsufficientStorage(HttpResponse):
+    status_code = http.client.INSUFFICIENT_STORAGE
+
+
+class HttpResponseRequestEntityTooLarge(HttpResponse):
+    status_code = http.client.REQUEST_ENTITY_TOO_LARGE
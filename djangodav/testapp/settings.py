@@ -11,6 +11,7 @@ INSTALLED_APPS = (
     'django.contrib.contenttypes',
 
     'djangodav',
+    'djangodav.testapp',
 )
 
 DATABASES = {
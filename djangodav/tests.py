@@ -0,0 +1,171 @@
+from __future__ import unicode_literals
+# Portions (c) 2014, Alexander Klimenko <alex@erix.ru>
+# All rights reserved.
+#
+# Copyright (c) 2011, SmartFile <btimby@smartfile.com>
+# All rights reserved.
+#
+# This file is part of DjangoDav.
+#
+# DjangoDav is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# DjangoDav is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+from io import BytesIO
+
+from django.test import TestCase
+from mock import Mock, patch
+
+from djangodav.acls import AUTHENTICATED, EVERYONE, AclEngine, FullAcl, ReadOnlyAcl
+from djangodav.base.resources import BaseDavResource
+from djangodav.locks import LockTable, MemoryLock
+from djangodav.responses import ResponseException
+from djangodav.utils import XmlBody
+
+
+class TestMemoryLock(TestCase):
+    def setUp(self):
+        class TestLock(MemoryLock):
+            table = LockTable()
+        self.lock_class = TestLock
+
+    def acquire(self, path, scope='exclusive', depth=-1):
+        return self.lock_class(BaseDavResource(path)).acquire(scope, 'write', depth, 600, 'owner')
+
+    def test_acquire_release(self):
+        token = self.acquire('/a/b')
+        self.assertTrue(token)
+        self.assertEqual([lock.token for lock in self.lock_class(BaseDavResource('/a/b/c')).get()], [token])
+        self.assertFalse(self.lock_class(BaseDavResource('/a')).release(token))
+        self.assertTrue(self.lock_class(BaseDavResource('/a/b/c')).release('<opaquelocktoken:%s>' % token))
+        self.assertEqual(self.lock_class.table.root.children, {})
+
+    def test_conflicts(self):
+        self.assertTrue(self.acquire('/a/b', depth=0))
+        self.assertIsNone(self.acquire('/a/b'))
+        self.assertIsNone(self.acquire('/a'))
+        self.assertTrue(self.acquire('/a', depth=0))
+        self.assertTrue(self.acquire('/a/b/c'))
+        self.assertTrue(self.acquire('/x', scope='shared'))
+        self.assertTrue(self.acquire('/x/y', scope='shared'))
+        self.assertIsNone(self.acquire('/x/y/z'))
+        self.assertIsNone(self.acquire('/'))
+
+    @patch('djangodav.locks.time.time')
+    def test_expiry_refresh(self, time):
+        time.return_value = 1000
+        token = self.acquire('/a')
+        self.acquire('/b')
+        time.return_value = 1500
+        lock = self.lock_class(BaseDavResource('/a/c')).refresh(token, 600)
+        self.assertEqual(lock.expires, 2100)
+        time.return_value = 1700
+        self.assertIsNone(self.acquire('/a/c'))
+        self.assertTrue(self.acquire('/b/c'))
+        time.return_value = 2200
+        self.assertEqual(self.lock_class(BaseDavResource('/a')).get(), [])
+        self.assertEqual([lock.path for lock in self.lock_class.table.tokens.values()], [['b', 'c']])
+
+    def test_del_locks(self):
+        self.acquire('/a/b')
+        self.acquire('/a/c/d')
+        token = self.acquire('/ab')
+        self.lock_class(BaseDavResource('/a/')).del_locks()
+        self.assertEqual(list(self.lock_class.table.tokens), [token])
+
+    def test_get_descendants(self):
+        self.acquire('/a', depth=0)
+        token = self.acquire('/a/b/c')
+        self.acquire('/ab')
+        self.assertEqual([lock.token for lock in self.lock_class(BaseDavResource('/a/')).get_descendants()], [token])
+        self.assertEqual(self.lock_class(BaseDavResource('/x/')).get_descendants(), [])
+
+
+class TestAclEngine(TestCase):
+    def setUp(self):
+        self.engine = AclEngine([
+            (EVERYONE, '/', ReadOnlyAcl()),
+            (EVERYONE, '/private/', ReadOnlyAcl(read=False)),
+            (AUTHENTICATED, '/home/', ReadOnlyAcl()),
+            ('alice', '/home/alice/', FullAcl()),
+            ('group:staff', '/private/shared/', ReadOnlyAcl()),
+        ])
+        self.alice = Mock(is_authenticated=True, get_username=Mock(return_value='alice'),
+                          groups=Mock(values_list=Mock(return_value=['staff'])))
+
+    def access(self, checker, path):
+        acl = checker.get_access(BaseDavResource(path))
+        return acl.read, acl.write, acl.delete
+
+    def test_get_access(self):
+        anonymous = self.engine.get_checker(Mock(is_authenticated=False))
+        alice = self.engine.get_checker(self.alice)
+        self.assertEqual(self.access(anonymous, '/home/alice/doc'), (True, False, False))
+        self.assertEqual(self.access(alice, '/home/alice/doc'), (True, True, True))
+        self.assertEqual(self.access(alice, '/home/bob/'), (True, False, False))
+        self.assertEqual(self.access(anonymous, '/private/shared/doc'), (False, False, False))
+        self.assertEqual(self.access(alice, '/private/shared/doc'), (True, False, False))
+        self.assertEqual(self.access(alice, '/private/other'), (False, False, False))
+        self.assertEqual(len(self.engine.tries), 2)
+
+    def test_get_principals(self):
+        bob = Mock(is_authenticated=Mock(return_value=True), get_username=Mock(return_value='bob'),
+                   groups=Mock(values_list=Mock(return_value=['other'])))
+        self.assertEqual(self.engine.get_principals(bob), frozenset([EVERYONE, AUTHENTICATED]))
+        self.assertEqual(self.engine.get_principals(Mock(is_authenticated=Mock(return_value=False))),
+                         frozenset([EVERYONE]))
+        self.assertEqual(self.engine.get_principals(self.alice),
+                         frozenset([EVERYONE, AUTHENTICATED, 'alice', 'group:staff']))
+
+    def test_max_tries(self):
+        self.engine.max_tries = 2
+        for name in ('alice', 'bob', 'carol', 'dave'):
+            self.engine.add_rule(name, '/home/%s/' % name, FullAcl())
+        users = [Mock(is_authenticated=True, get_username=Mock(return_value=name), groups=Mock(
+            values_list=Mock(return_value=[]))) for name in ('alice', 'bob', 'alice', 'carol', 'dave')]
+        checkers = [self.engine.get_checker(user) for user in users]
+        self.assertIs(checkers[0].memo[()][0], checkers[2].memo[()][0])
+        self.assertEqual(list(self.engine.tries),
+                         [frozenset([EVERYONE, AUTHENTICATED, name]) for name in ('carol', 'dave')])
+        self.assertEqual(self.access(checkers[4], '/home/dave/doc'), (True, True, True))
+
+    def test_filter(self):
+        checker = self.engine.get_checker(self.alice)
+        resources = [BaseDavResource(path) for path in ('/private/', '/private/shared/', '/private/other', '/doc')]
+        self.assertEqual([resource.path for resource in checker.filter(resources)],
+                         [['private', 'shared'], ['doc']])
+        self.assertIn(('private', 'other'), checker.memo)
+
+
+class TestXmlBody(TestCase):
+    def status(self, data, **kwargs):
+        try:
+            XmlBody(BytesIO(data), **kwargs)('/D:propfind/D:prop/*')
+        except ResponseException as e:
+            return e.response.status_code
+
+    def test_query(self):
+        stream = Mock(wraps=BytesIO(
+            b'<propfind xmlns="DAV:"><prop><displayname/><x:a xmlns:x="urn:x"/></prop></propfind>'))
+        xbody = XmlBody(stream)
+        self.assertFalse(stream.read.called)
+        self.assertEqual([el.tag for el in xbody('/D:propfind/D:prop/*')], ['{DAV:}displayname', '{urn:x}a'])
+        self.assertEqual(xbody('count(//D:prop)'), 1)
+        self.assertEqual(stream.read.call_count, 1)
+
+    def test_limits(self):
+        self.assertEqual(self.status(b'<propfind xmlns="DAV:"><allprop/></propfind>', max_size=10), 413)
+        self.assertEqual(self.status(b'<propfind xmlns="DAV:"><prop>'), 400)
+        self.assertEqual(self.status(
+            b'<?xml version="1.0"?><!DOCTYPE p [<!ENTITY a "aaaa"><!ENTITY b "&a;&a;&a;">]>'
+            b'<propfind xmlns="DAV:"><prop>&b;</prop></propfind>'), 400)
+        self.assertEqual(self.status(b'<a>' * 10 + b'</a>' * 10, max_depth=5), 400)
+        self.assertIsNone(self.status(b'<a>' * 5 + b'</a>' * 5, max_depth=5))
@@ -21,16 +21,21 @@ from __future__ import unicode_literals
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from builtins import str
-import datetime, time, calendar
+from builtins import object, str
+import datetime, time, calendar, re
 from wsgiref.handlers import format_date_time
+from django.http import HttpResponseBadRequest
 from django.utils.feedgenerator import rfc2822_date
+from django.utils.functional import cached_property
 
 try:
     from email.utils import parsedate_tz
 except ImportError:
     from email.Utils import parsedate_tz
 import lxml.builder as lb
+from lxml import etree
+
+from djangodav.responses import ResponseException, HttpResponseRequestEntityTooLarge
 
 # Sun, 06 Nov 1994 08:49:37 GMT  ; RFC 822, updated by RFC 1123
 FORMAT_RFC_822 = '%a, %d %b %Y %H:%M:%S GMT'
@@ -39,33 +44,212 @@ FORMAT_RFC_850 = '%A %d-%b-%y %H:%M:%S GMT'
 # Sun Nov  6 08:49:37 1994       ; ANSI C's asctime() format
 FORMAT_ASC = '%a %b %d %H:%M:%S %Y'
 
+PATTERN_ETAG = re.compile(r'(?:W/)?"((?:\\.|[^"])*)"')
+PATTERN_IF_ITEM = re.compile(r'\s*(?:<([^>]*)>|(\()|(\))|(Not)|\[([^\]]*)\])')
+
 WEBDAV_NS = "DAV:"
 
 WEBDAV_NSMAP = {'D': WEBDAV_NS}
 
 D = lb.ElementMaker(namespace=WEBDAV_NS, nsmap=WEBDAV_NSMAP)
 
-
-def get_property_tag_list(res, *names):
-    props = []
-    for name in names:
-        tag = get_property_tag(res, name)
-        if tag is None:
-            continue
-        props.append(tag)
-    return props
+# Request body queries of the views, compiled once
+XPATHS = dict((path, etree.XPath(path, namespaces=WEBDAV_NSMAP)) for path in (
+    '/D:propfind/D:prop/*',
+    '/D:propfind/D:allprop',
+    '/D:propfind/D:propname',
+    '/D:propertyupdate/D:set/D:prop/*',
+    '/D:propertyupdate/D:set/D:prop/* | /D:propertyupdate/D:remove/D:prop/*',
+    '/D:lockinfo/D:owner',
+    '/D:lockinfo/D:lockscope/*',
+    '/D:lockinfo/D:locktype/*',
+))
 
 
-def get_property_tag(res, name):
-    if name == 'resourcetype':
-        if res.is_collection:
-            return D(name, D.collection)
-        return D(name)
+def iter_file(f, chunk_size, length=None):
+    """Yield the content of a file object by chunks, stop after length bytes if it is given.
+    The file is closed when iteration finishes."""
     try:
-        if hasattr(res, name):
-            return D(name, str(getattr(res, name)))
-    except AttributeError:
+        while length is None or length > 0:
+            chunk = f.read(chunk_size if length is None else min(chunk_size, length))
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def iter_content(content, chunk_size):
+    """Yield byte chunks of resource content, which can be a string, a file object or an iterator."""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if isinstance(content, bytes):
+        if content:
+            yield content
         return
+    if hasattr(content, 'read'):
+        content = iter_file(content, chunk_size)
+    for chunk in content:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        yield chunk
+
+
+def iter_slice(chunks, start, length):
+    """Yield length bytes starting from start offset of the content given as byte chunks iterator."""
+    for chunk in chunks:
+        if length <= 0:
+            break
+        if start >= len(chunk):
+            start -= len(chunk)
+            continue
+        chunk = chunk[start:start + length]
+        start = 0
+        length -= len(chunk)
+        yield chunk
+
+
+def parse_range_header(header, length):
+    """Parse Range header value for the content of the given length. Return the list of (start, end)
+    byte ranges, end included. The list is empty when none of the ranges is satisfiable, None is
+    returned for malformed headers which have to be ignored."""
+    units, _, specs = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        start, sep, end = spec.partition('-')
+        start, end = start.strip(), end.strip()
+        if not sep or not (start or end):
+            return None
+        try:
+            if not start:
+                suffix = int(end)
+                if suffix > 0 and length > 0:
+                    ranges.append((max(length - suffix, 0), length - 1))
+                continue
+            start = int(start)
+            end = int(end) if end else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start < length:
+            ranges.append((start, length - 1 if end is None else min(end, length - 1)))
+    return ranges
+
+
+def parse_etags(value):
+    """Parse entity tags list of If-Match like headers. Tags are returned unquoted, the same way
+    resources provide getetag, weakness is ignored. Bare tags are accepted for lax clients."""
+    value = value.strip()
+    if value == '*':
+        return ['*']
+    etags = PATTERN_ETAG.findall(value)
+    if not etags:
+        etags = [etag.strip() for etag in value.split(',') if etag.strip()]
+    return etags
+
+
+def parse_if_header(value):
+    """Parse RFC 4918 If header into a list of (resource tag, conditions) pairs, one for each list
+    of the header; the tag is None for untagged lists. Conditions are (negated, kind, value) triples
+    where kind is 'token' for state tokens or 'etag' for unquoted entity tags. Raise ValueError if
+    the header is malformed."""
+    lists, tag, conditions, negated = [], None, None, False
+    value = value.strip()
+    position = 0
+    while position < len(value):
+        match = PATTERN_IF_ITEM.match(value, position)
+        if match is None:
+            raise ValueError('Malformed If header at %d' % position)
+        position = match.end()
+        url, opening, closing, negation, etag = match.groups()
+        if conditions is None:
+            if url is not None:
+                tag = url
+            elif opening:
+                conditions = []
+            else:
+                raise ValueError('List expected at %d' % position)
+        elif negation and not negated:
+            negated = True
+        elif url is not None or etag is not None:
+            if etag is not None:
+                etags = PATTERN_ETAG.findall(etag)
+                if len(etags) != 1:
+                    raise ValueError('Malformed entity tag at %d' % position)
+                conditions.append((negated, 'etag', etags[0]))
+            else:
+                conditions.append((negated, 'token', url))
+            negated = False
+        elif closing and conditions and not negated:
+            lists.append((tag, conditions))
+            conditions = None
+        else:
+            raise ValueError('Malformed list at %d' % position)
+    if conditions is not None or not lists:
+        raise ValueError('Unterminated If header')
+    return lists
+
+
+class XmlBody(object):
+    """Xml request body, parsed when first queried. At most max_size bytes are read (413 beyond),
+    documents with a DTD, nesting deeper than max_depth or malformed are rejected with 400. External
+    entities and network access are disabled. Called with an XPath expression like the lxml
+    XPathDocumentEvaluator, expressions of XPATHS are evaluated precompiled."""
+
+    def __init__(self, stream=None, max_size=1024 * 1024, max_depth=64, tree=None):
+        self.stream = stream
+        self.max_size = max_size
+        self.max_depth = max_depth
+        if tree is not None:
+            self.__dict__['tree'] = tree
+
+    def get_parser(self):
+        return etree.XMLParser(ns_clean=True, resolve_entities=False, no_network=True, load_dtd=False,
+                               huge_tree=False)
+
+    @cached_property
+    def tree(self):
+        data = self.stream.read(self.max_size + 1)
+        if len(data) > self.max_size:
+            raise ResponseException(HttpResponseRequestEntityTooLarge('Xml body exceeds %d bytes' % self.max_size))
+        try:
+            tree = etree.ElementTree(etree.fromstring(data, self.get_parser()))
+        except etree.XMLSyntaxError as e:
+            raise ResponseException(HttpResponseBadRequest('Malformed xml body: %s' % e))
+        if tree.docinfo.doctype:
+            raise ResponseException(HttpResponseBadRequest('Xml body must not have a DTD'))
+        depth = 0
+        for event, _ in etree.iterwalk(tree, events=('start', 'end')):
+            depth += 1 if event == 'start' else -1
+            if depth > self.max_depth:
+                raise ResponseException(HttpResponseBadRequest('Xml body nested too deep'))
+        return tree
+
+    def __call__(self, path):
+        xpath = XPATHS.get(path)
+        if xpath is None:
+            return self.tree.xpath(path, namespaces=WEBDAV_NSMAP)
+        return xpath(self.tree)
+
+
+def iter_batches(iterable, size):
+    """Yield lists of up to size consecutive items of iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def safe_join(root, *paths):
@@ -19,16 +19,20 @@ from __future__ import unicode_literals
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with DjangoDav.  If not, see <http://www.gnu.org/licenses/>.
+import errno
+from io import BytesIO
 from lxml.etree import ElementTree
 from django.http import HttpResponse, HttpRequest, Http404
-from djangodav.acls import FullAcl
-from djangodav.locks import DummyLock
+from djangodav.acls import EVERYONE, AclEngine, DavAcl, FullAcl, ReadOnlyAcl
+from djangodav.base.locks import ActiveLock
+from djangodav.db.properties import DBPropertyStore
+from djangodav.locks import DummyLock, LockTable, MemoryLock
 from djangodav.responses import ResponseException
 from lxml import etree
 
 from djangodav.base.tests.resources import MockCollection, MockObject, MissingMockCollection, MissingMockObject
 from djangodav.fs.tests import *
-from djangodav.utils import D, WEBDAV_NSMAP, rfc1123_date
+from djangodav.utils import D, WEBDAV_NSMAP, XmlBody, rfc1123_date
 from djangodav.views import DavView
 from mock import Mock
 
@@ -146,6 +150,23 @@ class TestView(TestCase):
             ), pretty_print=True, xml_declaration=True, encoding='utf-8')
         )
 
+    def test_propfind_listing_infinity_stream(self):
+        self.top_collection.get_descendants.return_value += [self.top_collection]
+        request = Mock(META={'HTTP_DEPTH': 'infinity'})
+        path = '/collection/'
+        v = DavView(base_url='/base/', path=path, request=request, acl_class=FullAcl)
+        v.__dict__['resource'] = self.top_collection
+        resp = v.propfind(request, path, None)
+        self.assertEqual(resp.status_code, 207)
+        self.assertTrue(resp.streaming)
+        self.top_collection.get_descendants.assert_called_with(depth=-1)
+        tree = etree.fromstring(b"".join(resp.streaming_content))
+        self.assertEqual(tree.tag, '{DAV:}multistatus')
+        self.assertEqual(tree.xpath('D:response/D:href/text()', namespaces=WEBDAV_NSMAP),
+                         ['/base/collection/sub_object', '/base/collection/sub_colection/', '/base/collection/'])
+        self.assertEqual(tree.xpath('D:response/D:propstat/D:prop/D:getcontentlength/text()',
+                                    namespaces=WEBDAV_NSMAP), ['42', '0', '0'])
+
     def test_propfind_exact_names(self):
         self.sub_object.get_descendants.return_value += [self.sub_object]
         request = Mock(META={})
@@ -243,6 +264,61 @@ class TestView(TestCase):
             ), pretty_print=True, xml_declaration=True, encoding='utf-8')
         )
 
+    def test_propfind_acl_engine(self):
+        request = Mock(META={}, user=None)
+        path = 'collection/'
+        engine = AclEngine([
+            (EVERYONE, '/', ReadOnlyAcl()),
+            (EVERYONE, '/collection/sub_colection/', ReadOnlyAcl(read=False)),
+        ])
+        v = DavView(base_url='/base/', path=path, request=request, acl_class=FullAcl, acl_engine=engine)
+        v.__dict__['resource'] = self.top_collection
+        v.get_access = Mock(wraps=v.get_access)
+        resp = v.propfind(request, path, None)
+        tree = etree.fromstring(resp.content)
+        self.assertEqual(tree.xpath('D:response/D:href/text()', namespaces=WEBDAV_NSMAP),
+                         ['/base/collection/sub_object'])
+        self.assertEqual(v.get_access.call_count, 1)
+
+    def test_proppatch_propfind_dead_properties(self):
+        request = Mock(META={})
+        path = 'collection/sub_object'
+        v = DavView(base_url='/base/', path=path, request=request, acl_class=FullAcl,
+                    property_store_class=DBPropertyStore)
+        v.__dict__['resource'] = self.sub_object
+        update = etree.fromstring(
+            '<D:propertyupdate xmlns:D="DAV:" xmlns:x="urn:x">'
+            '<D:set><D:prop><x:color>red</x:color><x:size>1</x:size></D:prop></D:set>'
+            '<D:remove><D:prop><x:size/></D:prop></D:remove>'
+            '</D:propertyupdate>')
+        resp = v.proppatch(request, path, etree.XPathDocumentEvaluator(ElementTree(update), namespaces=WEBDAV_NSMAP))
+        self.assertEqual(resp.status_code, 207)
+        tree = etree.fromstring(resp.content)
+        self.assertEqual(tree.xpath('//D:status/text()', namespaces=WEBDAV_NSMAP), ['HTTP/1.1 200 OK'])
+
+        self.sub_object.get_descendants.return_value += [self.sub_object]
+        resp = v.propfind(request, path, etree.XPathDocumentEvaluator(ElementTree(
+            D.propfind(D.prop(D.displayname(), etree.Element('{urn:x}color'), etree.Element('{urn:x}size')))
+        ), namespaces=WEBDAV_NSMAP))
+        propstats = etree.fromstring(resp.content).xpath('//D:propstat', namespaces=WEBDAV_NSMAP)
+        self.assertEqual([([(el.tag, el.text) for el in propstat[0]], propstat[1].text) for propstat in propstats], [
+            ([('{DAV:}displayname', 'sub_object'), ('{urn:x}color', 'red')], 'HTTP/1.1 200 OK'),
+            ([('{urn:x}size', None)], 'HTTP/1.1 404 Not Found'),
+        ])
+
+    def test_proppatch_protected(self):
+        request = Mock(META={})
+        path = 'collection/sub_object'
+        v = DavView(base_url='/base/', path=path, request=request, acl_class=FullAcl,
+                    property_store_class=Mock())
+        v.__dict__['resource'] = self.sub_object
+        update = D.propertyupdate(D.set(D.prop(D.displayname('new'), etree.Element('{urn:x}color'))))
+        resp = v.proppatch(request, path, etree.XPathDocumentEvaluator(ElementTree(update), namespaces=WEBDAV_NSMAP))
+        tree = etree.fromstring(resp.content)
+        self.assertEqual(tree.xpath('//D:status/text()', namespaces=WEBDAV_NSMAP),
+                         ['HTTP/1.1 403 Forbidden', 'HTTP/1.1 424 Failed Dependency'])
+        self.assertFalse(v.property_store.set_properties.called)
+
     def test_dispatch(self):
         request = Mock(
             spec=HttpRequest,
@@ -260,6 +336,106 @@ class TestView(TestCase):
         self.assertEqual(v.base_url, '/base')
         self.assertEqual(v.path, '/path/')
 
+    def dispatch_conditional(self, resource, method, lock_class=None, acl_class=FullAcl, **headers):
+        handler = Mock(return_value=HttpResponse())
+        request = Mock(spec=HttpRequest, META=dict(PATH_INFO='/base' + resource.get_path(), **headers),
+                       method=method)
+        v = DavView(request=request, acl_class=acl_class, _allowed_methods=Mock(return_value=[method]),
+                    lock_class=lock_class, resource_class=Mock(return_value=resource), **{method.lower(): handler})
+        v.__dict__['resource'] = resource
+        return v.dispatch(request, resource.get_path()), handler
+
+    def test_dispatch_if_none_match(self):
+        resp, handler = self.dispatch_conditional(self.sub_object, 'GET', HTTP_IF_NONE_MATCH='"%s"' % ('0' * 40))
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], '0' * 40)
+        self.assertFalse(handler.called)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'GET', HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(handler.called)
+
+    def test_dispatch_if_modified_since(self):
+        self.sub_object.get_mtime_stamp = Mock(return_value=1419400800)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'HEAD',
+                                                  HTTP_IF_MODIFIED_SINCE='Wed, 24 Dec 2014 06:00:00 GMT')
+        self.assertEqual(resp.status_code, 304)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'HEAD',
+                                                  HTTP_IF_MODIFIED_SINCE='Tue, 23 Dec 2014 06:00:00 GMT')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_dispatch_if_match(self):
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', HTTP_IF_MATCH='"other"')
+        self.assertEqual(resp.status_code, 412)
+        self.assertFalse(handler.called)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', HTTP_IF_MATCH='"%s"' % ('0' * 40))
+        self.assertEqual(resp.status_code, 200)
+        resp, handler = self.dispatch_conditional(self.missing_sub_object, 'PUT', HTTP_IF_MATCH='*')
+        self.assertEqual(resp.status_code, 412)
+
+    def test_dispatch_conditional_write_only(self):
+        write_only = lambda **kwargs: DavAcl(read=False, write=True)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', acl_class=write_only, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(resp.status_code, 412)
+        self.assertFalse(handler.called)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', acl_class=write_only, HTTP_IF_MATCH='"other"')
+        self.assertEqual(resp.status_code, 412)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'GET', acl_class=write_only,
+                                                  HTTP_IF_NONE_MATCH='"%s"' % ('0' * 40))
+        self.assertTrue(handler.called)
+
+    def test_dispatch_if_header(self):
+        class Lock(MemoryLock):
+            table = LockTable()
+        token = Lock(self.sub_object).acquire('exclusive', 'write', 0, 600, None)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', Lock)
+        self.assertEqual(resp.status_code, 423)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', Lock,
+                                                  HTTP_IF='(<opaquelocktoken:%s>)' % token)
+        self.assertEqual(resp.status_code, 200)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', Lock,
+                                                  HTTP_IF='(<opaquelocktoken:%s> ["other"])' % token)
+        self.assertEqual(resp.status_code, 412)
+        resp, handler = self.dispatch_conditional(
+            self.sub_object, 'GET', Lock,
+            HTTP_IF='</base/collection/sub_object> (Not <opaquelocktoken:%s>) (["%s"])' % (token, '0' * 40))
+        self.assertEqual(resp.status_code, 200)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'GET', Lock, HTTP_IF='(Not)')
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(handler.called)
+        # Lock manager without lock tracking
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', DummyLock, HTTP_IF='(Not <DAV:no-lock>)')
+        self.assertEqual(resp.status_code, 200)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', DummyLock, HTTP_IF='(<DAV:no-lock>)')
+        self.assertEqual(resp.status_code, 412)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'PUT', DummyLock,
+                                                  HTTP_IF='(<DAV:no-lock>) (<opaquelocktoken:any>)')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_dispatch_locked_members(self):
+        class Lock(MemoryLock):
+            table = LockTable()
+        token = Lock(self.sub_object).acquire('exclusive', 'write', 0, 600, None)
+        resp, handler = self.dispatch_conditional(self.top_collection, 'DELETE', Lock)
+        self.assertEqual(resp.status_code, 423)
+        resp, handler = self.dispatch_conditional(self.top_collection, 'PROPPATCH', Lock)
+        self.assertEqual(resp.status_code, 200)
+        resp, handler = self.dispatch_conditional(self.top_collection, 'DELETE', Lock,
+                                                  HTTP_IF='(Not <DAV:no-lock>) (<opaquelocktoken:%s>)' % token)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_dispatch_locked_parent(self):
+        class Lock(MemoryLock):
+            table = LockTable()
+        token = Lock(self.top_collection).acquire('exclusive', 'write', 0, 600, None)
+        for resource, method, status in ((self.sub_object, 'PUT', 200), (self.missing_sub_object, 'PUT', 423),
+                                         (self.missing_sub_collection, 'MKCOL', 423), (self.sub_object, 'DELETE', 423),
+                                         (self.sub_object, 'MOVE', 423), (self.sub_object, 'PROPPATCH', 200)):
+            resp, handler = self.dispatch_conditional(resource, method, Lock)
+            self.assertEqual(resp.status_code, status)
+        resp, handler = self.dispatch_conditional(self.sub_object, 'DELETE', Lock,
+                                                  HTTP_IF='(Not <DAV:no-lock>) (<opaquelocktoken:%s>)' % token)
+        self.assertEqual(resp.status_code, 200)
+
     def test_allowed_object(self):
         v = DavView()
         v.__dict__['resource'] = self.sub_object
@@ -322,12 +498,85 @@ class TestView(TestCase):
         path = '/obj.txt'
         v = DavView(path=path, _allowed_methods=Mock(return_value=['ALL']), acl_class=FullAcl)
         v.__dict__['resource'] = MockObject(path, read=Mock(return_value="C" * 42))
-        resp = v.get(None, path, acl_class=FullAcl)
+        resp = v.get(Mock(META={}), path, acl_class=FullAcl)
         self.assertEqual(resp['Etag'], "0" * 40)
         self.assertEqual(resp['Content-Type'], "text/plain")
         self.assertEqual(resp['Last-Modified'], "Wed, 24 Dec 2014 06:00:00 +0000")
         self.assertEqual(resp.content, b"C" * 42)
 
+    def test_get_obj_file_stream(self):
+        path = '/obj.txt'
+        v = DavView(path=path, _allowed_methods=Mock(return_value=['ALL']), acl_class=FullAcl)
+        v.__dict__['resource'] = MockObject(path, read=Mock(return_value=BytesIO(b"C" * 42)))
+        resp = v.get(Mock(META={}), path)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Length'], "42")
+        self.assertEqual(resp['Content-Type'], "text/plain")
+        self.assertEqual(b"".join(resp.streaming_content), b"C" * 42)
+
+    def test_get_obj_iterator_stream(self):
+        path = '/obj.txt'
+        v = DavView(path=path, _allowed_methods=Mock(return_value=['ALL']), acl_class=FullAcl)
+        v.__dict__['resource'] = MockObject(path, read=Mock(return_value=iter([b"C" * 21, b"C" * 21])))
+        resp = v.get(Mock(META={}), path)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(b"".join(resp.streaming_content), b"C" * 42)
+
+    def get_range(self, content, **meta):
+        path = '/obj.txt'
+        v = DavView(path=path, _allowed_methods=Mock(return_value=['ALL']), acl_class=FullAcl)
+        v.__dict__['resource'] = MockObject(path, getcontentlength=10, read=Mock(return_value=content))
+        return v.get(Mock(META=meta), path)
+
+    def test_get_range(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=2-5')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(resp['Content-Length'], '4')
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+        self.assertEqual(resp.content, b"2345")
+
+    def test_get_range_suffix_stream(self):
+        resp = self.get_range(BytesIO(b"0123456789"), HTTP_RANGE='bytes=-3')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b"".join(resp.streaming_content), b"789")
+
+    def test_get_range_unsatisfiable(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=10-')
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp['Content-Range'], 'bytes */10')
+
+    def test_get_range_malformed(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=5-2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b"0123456789")
+
+    def test_get_range_if_range_mismatch(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b"0123456789")
+
+    def test_get_range_if_range_match(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"%s"' % ("0" * 40))
+        self.assertEqual(resp.status_code, 206)
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=2-5',
+                              HTTP_IF_RANGE='Wed, 24 Dec 2014 06:00:00 GMT')
+        self.assertEqual(resp.status_code, 206)
+
+    def test_get_multiple_ranges(self):
+        resp = self.get_range(b"0123456789", HTTP_RANGE='bytes=0-1, 8-')
+        self.assertEqual(resp.status_code, 206)
+        content_type, boundary = resp['Content-Type'].split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        content = b"".join(resp.streaming_content)
+        self.assertEqual(int(resp['Content-Length']), len(content))
+        self.assertEqual(content, (
+            '--{0}\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-1/10\r\n\r\n01\r\n'
+            '--{0}\r\nContent-Type: text/plain\r\nContent-Range: bytes 8-9/10\r\n\r\n89\r\n'
+            '--{0}--\r\n'
+        ).format(boundary).encode('ascii'))
+
     @patch('djangodav.views.render_to_response', Mock(return_value=HttpResponse('listing')))
     def test_head_object(self):
         path = '/object.txt'
@@ -422,11 +671,95 @@ class TestView(TestCase):
         v = DavView(path=target.get_path(), acl_class=FullAcl, resource_class=Mock(), lock_class=DummyLock)
         v.__dict__['resource'] = target
         request = HttpRequest()
-        target.delete = Mock()
+        target.delete = Mock(return_value=None)
         resp = v.delete(request, target.get_path())
         self.assertTrue(target.delete.called)
         self.assertEqual(204, resp.status_code)
 
+    def test_delete_errors(self):
+        target = self.sub_collection
+        v = DavView(path=target.get_path(), base_url='/base', acl_class=FullAcl, resource_class=Mock(),
+                    lock_class=DummyLock)
+        v.__dict__['resource'] = target
+        request = HttpRequest()
+        target.delete = Mock(return_value=[(self.sub_object, OSError(errno.EACCES, 'Permission denied'))])
+        resp = v.delete(request, target.get_path())
+        self.assertEqual(207, resp.status_code)
+        self.assertEqual(resp.content,
+            b'<?xml version=\'1.0\' encoding=\'utf-8\'?>\n'
+            b'<D:multistatus xmlns:D="DAV:"><D:response><D:href>/base/collection/sub_object</D:href>'
+            b'<D:status>HTTP/1.1 403 Forbidden</D:status></D:response></D:multistatus>'
+        )
+
+    def test_lock_refresh(self):
+        target = self.sub_object
+        lock = ActiveLock('token', target.path, 0, 'exclusive', 'write', 'owner', 3600)
+        lock_class = Mock(return_value=Mock(refresh=Mock(side_effect=[None, lock])))
+        request = HttpRequest()
+        request.META['HTTP_IF'] = '(<opaquelocktoken:other>) (<opaquelocktoken:token>)'
+        request.META['HTTP_TIMEOUT'] = 'Second-3600'
+        v = DavView(request=request, path=target.get_path(), acl_class=FullAcl, lock_class=lock_class)
+        v.__dict__['resource'] = target
+        resp = v.lock(request, target.get_path())
+        self.assertEqual(resp.status_code, 200)
+        lock_class.return_value.refresh.assert_called_with('opaquelocktoken:token', 3600)
+        self.assertEqual(resp.content, etree.tostring(D.activelock(
+            D.locktype(D.write()), D.lockscope(D.exclusive()), D.depth('0'), D.timeout('Second-3600'),
+            D.locktoken(D.href('opaquelocktoken:token')), D.owner('owner'),
+        ), xml_declaration=True, encoding='utf-8'))
+
+    def test_lock_depth(self):
+        target = self.sub_object
+        for header, depth in ((None, -1), ('infinity', -1), ('Infinity', -1), ('0', 0)):
+            request = HttpRequest()
+            if header is not None:
+                request.META['HTTP_DEPTH'] = header
+            lock_class = Mock(return_value=Mock(acquire=Mock(return_value='token')))
+            v = DavView(request=request, path=target.get_path(), acl_class=FullAcl, lock_class=lock_class)
+            v.__dict__['resource'] = target
+            xbody = XmlBody(BytesIO(
+                b'<lockinfo xmlns="DAV:"><lockscope><exclusive/></lockscope><locktype><write/></locktype></lockinfo>'))
+            resp = v.lock(request, target.get_path(), xbody)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(lock_class.return_value.acquire.call_args[0][:3], ('exclusive', 'write', depth))
+            self.assertEqual(resp['Lock-Token'], '<opaquelocktoken:token>')
+            self.assertEqual(etree.fromstring(resp.content).findtext('{DAV:}depth'),
+                             'infinity' if depth == -1 else '0')
+
+    def test_lock_wrong_depth(self):
+        target = self.sub_object
+        for header in ('1', 'x'):
+            request = HttpRequest()
+            request.META['HTTP_DEPTH'] = header
+            lock_class = Mock()
+            v = DavView(request=request, path=target.get_path(), acl_class=FullAcl, lock_class=lock_class)
+            v.__dict__['resource'] = target
+            try:
+                resp = v.lock(request, target.get_path(), XmlBody(BytesIO(b'<lockinfo xmlns="DAV:"/>')))
+            except ResponseException as e:
+                resp = e.response
+            self.assertEqual(resp.status_code, 400)
+            self.assertFalse(lock_class.return_value.acquire.called)
+
+    def test_get_lock_timeout(self):
+        v = DavView(max_lock_timeout=86400)
+        for header, timeout in ((None, 600), ('Second-3600', 3600), ('Infinite, Second-4100000000', 86400),
+                                ('Second-4100000000', 86400), ('Extend-1, Second-60', 60), ('Second-x', 600)):
+            request = HttpRequest()
+            if header is not None:
+                request.META['HTTP_TIMEOUT'] = header
+            self.assertEqual(v.get_lock_timeout(request), timeout)
+
+    def test_lock_refresh_mismatch(self):
+        target = self.sub_object
+        for header, status in (('(<opaquelocktoken:other>)', 412), ('', 400)):
+            request = HttpRequest()
+            request.META['HTTP_IF'] = header
+            v = DavView(request=request, path=target.get_path(), acl_class=FullAcl,
+                        lock_class=Mock(return_value=Mock(refresh=Mock(return_value=None))))
+            v.__dict__['resource'] = target
+            self.assertEqual(v.lock(request, target.get_path()).status_code, status)
+
     def test_delete_missing(self):
         target = self.missing_sub_object
         v = DavView(path=target.get_path(), acl_class=FullAcl, resource_class=Mock(), lock_class=DummyLock)
@@ -503,3 +836,48 @@ class TestView(TestCase):
         self.assertEqual(204, resp.status_code)
         self.assertTrue(src.move.called)
         self.assertTrue(dst.delete.called)
+
+    def relocate_locked(self, method, src, dst, **headers):
+        class Lock(MemoryLock):
+            table = LockTable()
+        request = HttpRequest()
+        request.META.update(HTTP_DESTINATION="http://testserver%s" % dst.get_escaped_path(), SERVER_NAME='testserver',
+                            SERVER_PORT='80', HTTP_DEPTH='infinity', **headers)
+        setattr(src, method, Mock(return_value=None))
+        v = DavView(base_url='http://testserver', request=request, path=src.get_path(), acl_class=FullAcl,
+                    resource_class=Mock(return_value=dst), lock_class=Lock)
+        v.__dict__['resource'] = src
+        return v, Lock
+
+    def test_copy_locked_destination(self):
+        v, Lock = self.relocate_locked('copy', self.sub_object, self.missing_sub_object)
+        token = Lock(self.missing_sub_object).acquire('exclusive', 'write', 0, 600, None)
+        with self.assertRaises(ResponseException) as e:
+            v.copy(v.request, self.sub_object.get_path(), None)
+        self.assertEqual(e.exception.response.status_code, 423)
+        self.assertFalse(self.sub_object.copy.called)
+        v.request.META['HTTP_IF'] = '<http://testserver/collection/missing_sub_object> (<opaquelocktoken:%s>)' % token
+        v.__dict__.pop('if_header')
+        self.assertEqual(v.copy(v.request, self.sub_object.get_path(), None).status_code, 201)
+
+    def test_copy_locked_destination_parent(self):
+        v, Lock = self.relocate_locked('copy', self.sub_object, self.missing_sub_object)
+        Lock(self.top_collection).acquire('exclusive', 'write', 0, 600, None)
+        with self.assertRaises(ResponseException) as e:
+            v.copy(v.request, self.sub_object.get_path(), None)
+        self.assertEqual(e.exception.response.status_code, 423)
+        self.assertFalse(self.sub_object.copy.called)
+
+    def test_relocate_without_locks(self):
+        for dst, status in ((self.missing_sub_object, 201), (self.blank_collection, 204)):
+            v, Lock = self.relocate_locked('move', self.sub_object, dst)
+            v.lock_class = None
+            dst.delete = Mock()
+            self.assertEqual(v.move(v.request, self.sub_object.get_path(), None).status_code, status)
+            self.assertTrue(self.sub_object.move.called)
+
+    def test_move_drops_source_locks(self):
+        v, Lock = self.relocate_locked('move', self.sub_object, self.missing_sub_object)
+        Lock(self.sub_object).acquire('exclusive', 'write', 0, 600, None)
+        self.assertEqual(v.move(v.request, self.sub_object.get_path(), None).status_code, 201)
+        self.assertEqual(Lock(self.sub_object).get(), [])
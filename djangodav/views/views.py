@@ -2,38 +2,48 @@ from __future__ import unicode_literals
 from future import standard_library
 standard_library.install_aliases()
 from builtins import str
-import urllib.request, urllib.parse, urllib.error, re
+import urllib.request, urllib.parse, urllib.error
+import errno
 try:
     import urllib.parse
 except ImportError:
     from urllib import parse as urlparse
+from io import BytesIO
 from sys import version_info as python_version
+from uuid import uuid4
 from django.utils.timezone import now
 from lxml import etree
 
 from django.http import HttpResponseForbidden, HttpResponseNotAllowed, HttpResponseBadRequest, \
-    HttpResponseNotModified, HttpResponseRedirect, Http404
+    HttpResponseNotModified, HttpResponseRedirect, Http404, StreamingHttpResponse
+try:
+    from django.http import FileResponse
+except ImportError:
+    FileResponse = None
 from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
-from django.utils.http import parse_etags
 from django.shortcuts import render_to_response
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
 from djangodav.responses import ResponseException, HttpResponsePreconditionFailed, HttpResponseCreated, HttpResponseNoContent, \
     HttpResponseConflict, HttpResponseMediatypeNotSupported, HttpResponseBadGateway, \
-    HttpResponseMultiStatus, HttpResponseLocked, HttpResponse
-from djangodav.utils import WEBDAV_NSMAP, D, url_join, get_property_tag_list, rfc1123_date
+    HttpResponseMultiStatus, HttpResponseLocked, HttpResponse, HttpResponseRequestedRangeNotSatisfiable, \
+    StreamingHttpResponseMultiStatus
+from djangodav.utils import WEBDAV_NS, WEBDAV_NSMAP, D, url_join, rfc1123_date, iter_file, iter_content, \
+    iter_batches, parse_range_header, parse_time, parse_etags, parse_if_header, XmlBody
+from djangodav.base.locks import normalize_token
 from djangodav import VERSION as djangodav_version
 from django import VERSION as django_version, get_version
 
-PATTERN_IF_DELIMITER = re.compile(r'(<([^>]+)>)|(\(([^\)]+)\))')
 
 class DavView(View):
     # TODO introduce abstract base classes
     resource_class = None
     lock_class = None
     acl_class = None
+    acl_engine = None
+    property_store_class = None
     template_name = 'djangodav/index.html'
     http_method_names = ['options', 'put', 'mkcol', 'head', 'get', 'delete', 'propfind', 'proppatch', 'copy', 'move', 'lock', 'unlock']
     server_header = 'DjangoDav/%s Django/%s Python/%s' % (
@@ -43,6 +53,18 @@ class DavView(View):
     )
     xml_pretty_print = False
     xml_encoding = 'utf-8'
+    xml_body_max_size = 1024 * 1024
+    xml_body_max_depth = 64
+    stream_block_size = 64 * 1024
+    max_ranges = 20
+    xml_stream_depths = (-1,)
+    propfind_batch_size = 100
+    conditional_methods = ('GET', 'HEAD', 'PUT')
+    lock_checked_methods = ('PUT', 'DELETE', 'PROPPATCH', 'MKCOL', 'MOVE')
+    lock_checked_descendants_methods = ('DELETE', 'MOVE')
+    lock_timeout = 600  # Seconds, when the client does not ask for a timeout
+    max_lock_timeout = 7 * 24 * 3600  # Seconds granted for Infinite and longer timeouts
+    condition_headers = ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE')
 
     def no_access(self):
         return HttpResponseForbidden()
@@ -62,16 +84,23 @@ class DavView(View):
             and "/xml" in meta('CONTENT_TYPE', '')
             and meta('CONTENT_LENGTH', 0) != ''
             and int(meta('CONTENT_LENGTH', 0)) > 0):
-            self.xbody = kwargs['xbody'] = etree.XPathDocumentEvaluator(
-                etree.parse(request, etree.XMLParser(ns_clean=True)),
-                namespaces=WEBDAV_NSMAP
-            )
+            self.xbody = kwargs['xbody'] = XmlBody(request, self.xml_body_max_size, self.xml_body_max_depth)
 
         if request.method.upper() in self._allowed_methods():
             handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
         else:
             handler = self.http_method_not_allowed
         try:
+            # Not modified answers are for readers only, preconditions of writes always apply
+            if request.method.upper() in self.conditional_methods and self.has_conditions(request) and \
+                    (request.method.upper() not in ('GET', 'HEAD') or self.has_access(self.resource, 'read')):
+                self.evaluate_conditions(self.resource)
+            if request.META.get('HTTP_IF') and not self.evaluate_if_header():
+                raise ResponseException(HttpResponsePreconditionFailed('If header evaluated to false'))
+            method = request.method.upper()
+            if method in self.lock_checked_methods and self.lock_class is not None:
+                self.check_locks(self.resource, method in self.lock_checked_descendants_methods,
+                                 parent=method in self.lock_checked_descendants_methods or not self.resource.exists)
             resp = handler(request, self.path, *args, **kwargs)
         except ResponseException as e:
             resp = e.response
@@ -109,11 +138,31 @@ class DavView(View):
     def get_access(self, resource):
         """Return permission as DavAcl object. A DavACL should have the following attributes:
         read, write, delete, create, relocate, list. By default we implement a read-only
-        system."""
+        system. With acl_engine set, the permissions come from its rules."""
+        if self.acl_engine is not None:
+            return self.acl_checker.get_access(resource)
         return self.acl_class(read=True, full=False)
 
+    @cached_property
+    def acl_checker(self):
+        return self.acl_engine.get_checker(getattr(self.request, 'user', None))
+
+    @cached_property
+    def accesses(self):
+        return {}
+
     def has_access(self, resource, method):
-        return getattr(self.get_access(resource), method)
+        """Check method permission, get_access is called once per resource path and request."""
+        key = tuple(resource.path)
+        if key not in self.accesses:
+            self.accesses[key] = self.get_access(resource)
+        return getattr(self.accesses[key], method)
+
+    def filter_readable(self, resources):
+        """Return resources of a PROPFIND batch the user may read."""
+        if self.acl_engine is not None:
+            return self.acl_checker.filter(resources, 'read')
+        return [resource for resource in resources if self.has_access(resource, 'read')]
 
     def get_resource_kwargs(self, **kwargs):
         return kwargs
@@ -125,6 +174,12 @@ class DavView(View):
     def get_resource(self, **kwargs):
         return self.resource_class(**self.get_resource_kwargs(**kwargs))
 
+    @cached_property
+    def property_store(self):
+        if self.property_store_class is None:
+            return None
+        return self.property_store_class()
+
     def get_depth(self, default='1'):
         depth = str(self.request.META.get('HTTP_DEPTH', default)).lower()
         if not depth in ('0', '1', 'infinity'):
@@ -135,48 +190,41 @@ class DavView(View):
             depth = int(depth)
         return depth
 
+    def has_conditions(self, request):
+        return any(request.META.get(header) for header in self.condition_headers)
+
     def evaluate_conditions(self, res):
-        if not res.exists:
-            return
-        etag = res.get_etag()
-        mtime = res.get_mtime_stamp()
-        cond_if_match = self.request.META.get('HTTP_IF_MATCH', None)
+        """Evaluate If-Match, If-Unmodified-Since, If-None-Match and If-Modified-Since headers in the
+        order of RFC 7232 against metadata of res, raise ResponseException with 412 or 304 response
+        when the request should not be processed."""
+        meta = self.request.META.get
+        method = self.request.method.upper()
+        cond_if_match = meta('HTTP_IF_MATCH')
         if cond_if_match:
             etags = parse_etags(cond_if_match)
-            if '*' in etags or etag in etags:
+            if not res.exists or ('*' not in etags and res.getetag not in etags):
                 raise ResponseException(HttpResponsePreconditionFailed())
-        cond_if_modified_since = self.request.META.get('HTTP_IF_MODIFIED_SINCE', False)
-        if cond_if_modified_since:
-            # Parse and evaluate, but don't raise anything just yet...
-            # This might be ignored based on If-None-Match evaluation.
-            cond_if_modified_since = parse_time(cond_if_modified_since)
-            if cond_if_modified_since and cond_if_modified_since > mtime:
-                cond_if_modified_since = True
-            else:
-                cond_if_modified_since = False
-        cond_if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH', None)
+        else:
+            cond_if_unmodified_since = parse_time(meta('HTTP_IF_UNMODIFIED_SINCE', ''))
+            if cond_if_unmodified_since and res.exists and int(res.get_mtime_stamp()) > cond_if_unmodified_since:
+                raise ResponseException(HttpResponsePreconditionFailed())
+        cond_if_none_match = meta('HTTP_IF_NONE_MATCH')
         if cond_if_none_match:
             etags = parse_etags(cond_if_none_match)
-            if '*' in etags or etag in etags:
-                if self.request.method in ('GET', 'HEAD'):
-                    raise ResponseException(HttpResponseNotModified())
+            if res.exists and ('*' in etags or res.getetag in etags):
+                if method in ('GET', 'HEAD'):
+                    raise ResponseException(self.build_not_modified_response(res))
                 raise ResponseException(HttpResponsePreconditionFailed())
-            # Ignore If-Modified-Since header...
-            cond_if_modified_since = False
-        cond_if_unmodified_since = self.request.META.get('HTTP_IF_UNMODIFIED_SINCE', None)
-        if cond_if_unmodified_since:
-            cond_if_unmodified_since = parse_time(cond_if_unmodified_since)
-            if cond_if_unmodified_since and cond_if_unmodified_since <= mtime:
-                raise ResponseException(HttpResponsePreconditionFailed())
-        if cond_if_modified_since:
-            # This previously evaluated True and is not being ignored...
-            raise ResponseException(HttpResponseNotModified())
-        # TODO: complete If header handling...
-        cond_if = self.request.META.get('HTTP_IF', None)
-        if cond_if:
-            if not cond_if.startswith('<'):
-                cond_if = '<*>' + cond_if
-            #for (tmpurl, url, tmpcontent, content) in PATTERN_IF_DELIMITER.findall(cond_if):
+        elif method in ('GET', 'HEAD'):
+            cond_if_modified_since = parse_time(meta('HTTP_IF_MODIFIED_SINCE', ''))
+            if cond_if_modified_since and res.exists and int(res.get_mtime_stamp()) <= cond_if_modified_since:
+                raise ResponseException(self.build_not_modified_response(res))
+
+    def build_not_modified_response(self, res):
+        response = HttpResponseNotModified()
+        if res.is_object:
+            response['ETag'] = res.getetag
+        return response
 
     def get(self, request, path, head=False, *args, **kwargs):
         if not self.resource.exists:
@@ -191,16 +239,78 @@ class DavView(View):
         if not self.has_access(self.resource, 'read'):
             return self.no_access()
         if self.resource.is_object:
-            response['Content-Type'] = self.resource.content_type
-            response['ETag'] = self.resource.getetag
             if not head:
-                response['Content-Length'] = self.resource.getcontentlength
-                response.content = self.resource.read()
+                ranges = self.get_ranges(request)
+                if ranges is None:
+                    response = self.build_content_response(self.resource.read())
+                    response['Content-Length'] = self.resource.getcontentlength
+                else:
+                    response = self.build_ranges_response(ranges)
+            response['Accept-Ranges'] = 'bytes'
+            if not response.get('Content-Type', '').startswith('multipart/byteranges'):
+                response['Content-Type'] = self.resource.content_type
+            response['ETag'] = self.resource.getetag
         elif not head:
             response = render_to_response(self.template_name, dict(resource=self.resource, base_url=self.base_url))
         response['Last-Modified'] = self.resource.getlastmodified
         return response
 
+    def get_ranges(self, request):
+        """Return the list of (start, end) byte ranges requested by Range header. None means that whole
+        content should be sent: there is no Range header, it is malformed or If-Range doesn't match."""
+        header = request.META.get('HTTP_RANGE')
+        if not header:
+            return None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range:
+            if if_range.startswith('"') or if_range.startswith('W/'):
+                if if_range.startswith('W/') or parse_etags(if_range) != [self.resource.getetag]:
+                    return None
+            elif parse_time(if_range) != int(self.resource.get_mtime_stamp()):
+                return None
+        ranges = parse_range_header(header, self.resource.getcontentlength)
+        if ranges is not None and len(ranges) > self.max_ranges:
+            return None
+        return ranges
+
+    def build_ranges_response(self, ranges):
+        """Build 206 Partial Content response for a single range, or multipart/byteranges response
+        for several ones. Content is read with resource read_range, so only requested bytes are read."""
+        length = self.resource.getcontentlength
+        if not ranges:
+            response = HttpResponseRequestedRangeNotSatisfiable()
+            response['Content-Range'] = 'bytes */%d' % length
+            return response
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            response = self.build_content_response(self.resource.read_range(start, end), status=206)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, length)
+            response['Content-Length'] = end - start + 1
+            return response
+        boundary = uuid4().hex
+        headers = [
+            ('--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n' % (
+                boundary, self.resource.content_type or 'application/octet-stream', start, end, length
+            )).encode('ascii')
+            for start, end in ranges
+        ]
+        closing = ('--%s--\r\n' % boundary).encode('ascii')
+
+        def parts():
+            for header, (start, end) in zip(headers, ranges):
+                yield header
+                for chunk in iter_content(self.resource.read_range(start, end), self.stream_block_size):
+                    yield chunk
+                yield b'\r\n'
+            yield closing
+
+        response = StreamingHttpResponse(parts(), status=206,
+                                         content_type='multipart/byteranges; boundary=%s' % boundary)
+        response['Content-Length'] = sum(
+            len(header) + end - start + 1 + 2 for header, (start, end) in zip(headers, ranges)
+        ) + len(closing)
+        return response
+
     def head(self, request, path, *args, **kwargs):
         return self.get(request, path, head=True, *args, **kwargs)
 
@@ -227,8 +337,13 @@ class DavView(View):
             raise Http404("Resource doesn't exists")
         if not self.has_access(self.resource, 'delete'):
             return self.no_access()
-        self.lock_class(self.resource).del_locks()
-        self.resource.delete()
+        if self.lock_class is not None:
+            self.lock_class(self.resource).del_locks()
+        errors = self.resource.delete()
+        if self.property_store is not None:
+            self.property_store.delete(self.resource)
+        if errors:
+            return self.build_errors_response(errors)
         response = HttpResponseNoContent()
         self.__dict__['resource'] = self.get_resource(path=self.resource.get_path())
         return response
@@ -272,13 +387,21 @@ class DavView(View):
         if not overwrite and dst.exists:
             return HttpResponsePreconditionFailed('Destination exists and overwrite False.')
         dst_exists = dst.exists
+        if self.lock_class is not None:
+            self.check_locks(dst, descendants=True, parent=not dst_exists)
         if dst_exists:
-            self.lock_class(self.resource).del_locks()
-            self.lock_class(dst).del_locks()
+            if self.lock_class is not None:
+                self.lock_class(dst).del_locks()
             dst.delete()
+            if self.property_store is not None:
+                self.property_store.delete(dst)
         errors = getattr(self.resource, method)(dst, *args, **kwargs)
         if errors:
-            return self.build_xml_response(response_class=HttpResponseMultiStatus) # WAT?
+            return self.build_errors_response(errors)
+        if method == 'move' and self.lock_class is not None:
+            self.lock_class(self.resource).del_locks()
+        if self.property_store is not None:
+            getattr(self.property_store, method)(self.resource, dst)
         if dst_exists:
             return HttpResponseNoContent()
         return HttpResponseCreated()
@@ -294,23 +417,110 @@ class DavView(View):
             return self.no_access()
         return self.relocate(request, path, 'move')
 
+    def get_lock_timeout(self, request):
+        """Return the first timeout of the Timeout header list (Second-N or Infinite) in seconds,
+        capped by max_lock_timeout. Unknown values are skipped, lock_timeout is used without any."""
+        for value in request.META.get('HTTP_TIMEOUT', '').split(','):
+            value = value.strip().lower()
+            if value == 'infinite':
+                return self.max_lock_timeout
+            if value.startswith('second-') and value[len('second-'):].isdigit():
+                return min(int(value[len('second-'):]), self.max_lock_timeout)
+        return self.lock_timeout
+
+    @cached_property
+    def if_header(self):
+        """Parsed If header of the request, see utils.parse_if_header."""
+        if not self.request.META.get('HTTP_IF'):
+            return []
+        try:
+            return parse_if_header(self.request.META['HTTP_IF'])
+        except ValueError as e:
+            raise ResponseException(HttpResponseBadRequest('Malformed If header: %s' % e))
+
+    def get_if_lock_tokens(self, request):
+        """Return the lock tokens submitted in If header state lists."""
+        return [
+            value for tag, conditions in self.if_header for negated, kind, value in conditions
+            if kind == 'token' and not negated
+        ]
+
+    @cached_property
+    def active_locks(self):
+        return {}
+
+    def get_active_locks(self, resource):
+        """Return lock tokens covering resource, asked to the lock manager once per request and
+        resource. None when the lock manager doesn't track locks."""
+        key = tuple(resource.path)
+        if key not in self.active_locks:
+            locks = self.lock_class(resource).get()
+            self.active_locks[key] = None if locks is None else set(lock.token for lock in locks)
+        return self.active_locks[key]
+
+    def get_tagged_resource(self, tag):
+        """Return the resource identified by If header resource tag, None if it is outside of the view."""
+        tag_path = urllib.parse.unquote(urllib.parse.urlparse(tag).path)
+        if not tag_path.startswith(self.base_url):
+            return None
+        return self.get_resource(path=tag_path[len(self.base_url):] or '/')
+
+    def evaluate_if_list(self, resource, conditions):
+        for negated, kind, value in conditions:
+            if kind == 'token':
+                tokens = self.get_active_locks(resource)
+                if tokens is None:  # Without lock tracking any lock token may be valid, DAV:no-lock never is
+                    matches = value.strip().startswith('opaquelocktoken:')
+                else:
+                    matches = normalize_token(value) in tokens
+            else:
+                matches = resource.exists and resource.getetag == value
+            if matches == negated:
+                return False
+        return True
+
+    def evaluate_if_header(self):
+        """Return True if any list of the If header matches the state of its resource: the requested
+        one for untagged lists."""
+        for tag, conditions in self.if_header:
+            resource = self.resource if tag is None else self.get_tagged_resource(tag)
+            if resource is not None and self.evaluate_if_list(resource, conditions):
+                return True
+        return False
+
+    def check_locks(self, resource, descendants=False, parent=False):
+        """Raise 423 Locked response when the resource is locked and none of its lock tokens is
+        submitted in the If header. With descendants, every locked descendant needs one of its tokens
+        submitted too. With parent, the request adds or removes the resource as a member of its parent
+        collection, so a lock of the parent needs its token submitted as well."""
+        submitted = set(normalize_token(token) for token in self.get_if_lock_tokens(self.request))
+        tokens = self.get_active_locks(resource)
+        if tokens and not tokens & submitted:
+            raise ResponseException(HttpResponseLocked('Resource is locked'))
+        if parent and not resource.is_root:
+            tokens = self.get_active_locks(resource.get_parent())
+            if tokens and not tokens & submitted:
+                raise ResponseException(HttpResponseLocked('Parent collection is locked'))
+        if not descendants:
+            return
+        locked = {}
+        for lock in self.lock_class(resource).get_descendants() or ():
+            locked.setdefault(str(lock.path), set()).add(lock.token)
+        if any(not path_tokens & submitted for path_tokens in locked.values()):
+            raise ResponseException(HttpResponseLocked('Resource has locked members'))
+
     def lock(self, request, path, xbody=None, *args, **kwargs):
-        # TODO Lock refreshing
         if not self.has_access(self.resource, 'write'):
             return self.no_access()
 
         if not xbody:
-            return HttpResponseBadRequest('Lockinfo required')
+            return self.refresh_lock(request)
 
-        try:
-            depth = int(request.META.get('HTTP_DEPTH', '0'))
-        except ValueError:
-            return HttpResponseBadRequest('Wrong depth')
+        depth = self.get_depth(default='infinity')
+        if depth == 1:
+            return HttpResponseBadRequest('Depth of a lock must be 0 or infinity')
 
-        try:
-            timeout = int(request.META.get('HTTP_LOCK_TIMEOUT', 'Seconds-600')[len('Seconds-'):])
-        except ValueError:
-            return HttpResponseBadRequest('Wrong timeout')
+        timeout = self.get_lock_timeout(request)
 
         owner = None
         try:
@@ -344,12 +554,39 @@ class DavView(View):
         body = D.activelock(*([
             D.locktype(locktype_obj),
             D.lockscope(lockscope_obj),
-            D.depth(str(depth)),
+            D.depth('infinity' if depth == -1 else str(depth)),
             D.timeout("Second-%s" % timeout),
             D.locktoken(D.href('opaquelocktoken:%s' % token))]
             + ([owner_obj] if owner_obj is not None else [])
         ))
 
+        response = self.build_xml_response(body)
+        response['Lock-Token'] = '<opaquelocktoken:%s>' % token
+        return response
+
+    def refresh_lock(self, request):
+        """Handle LOCK request without body, refreshing the lock given in If header."""
+        tokens = self.get_if_lock_tokens(request)
+        if not tokens:
+            return HttpResponseBadRequest('Lockinfo required')
+        timeout = self.get_lock_timeout(request)
+        lock_manager = self.lock_class(self.resource)
+        for token in tokens:
+            lock = lock_manager.refresh(token, timeout)
+            if lock is not None:
+                break
+        else:
+            return HttpResponsePreconditionFailed('Lock token does not match')
+
+        body = D.activelock(*([
+            D.locktype(D(lock.type)),
+            D.lockscope(D(lock.scope)),
+            D.depth('infinity' if lock.depth == -1 else str(lock.depth)),
+            D.timeout("Second-%s" % lock.timeout),
+            D.locktoken(D.href('opaquelocktoken:%s' % lock.token))]
+            + ([D.owner(lock.owner)] if lock.owner else [])
+        ))
+
         return self.build_xml_response(body)
 
     def unlock(self, request, path, xbody=None, *args, **kwargss):
@@ -370,48 +607,78 @@ class DavView(View):
         if not self.resource.exists:
             raise Http404("Resource doesn't exists")
 
-        if not self.get_access(self.resource):
-            return self.no_access()
-
         get_all_props, get_prop, get_prop_names = True, False, False
         if xbody:
-            get_prop = [p.xpath('local-name()') for p in xbody('/D:propfind/D:prop/*')]
+            get_prop = [etree.QName(p) for p in xbody('/D:propfind/D:prop/*')]
             get_all_props = xbody('/D:propfind/D:allprop')
             get_prop_names = xbody('/D:propfind/D:propname')
             if int(bool(get_prop)) + int(bool(get_all_props)) + int(bool(get_prop_names)) != 1:
                 return HttpResponseBadRequest()
 
-        children = self.resource.get_descendants(depth=self.get_depth())
+        depth = self.get_depth()
+        children = self.resource.get_descendants(depth=depth)
 
         if get_prop_names:
-            responses = [
-                D.response(
-                    D.href(url_join(self.base_url, child.get_escaped_path())),
-                    D.propstat(
-                        D.prop(*[
-                            D(name) for name in child.ALL_PROPS
-                        ]),
-                        D.status('HTTP/1.1 200 OK'),
-                    ),
-                )
-                for child in children
-            ]
+            responses = self.iter_propname_responses(children)
+        elif get_prop:
+            responses = self.iter_propfind_responses(
+                children,
+                [name.localname for name in get_prop if name.namespace == WEBDAV_NS],
+                [name.text for name in get_prop if name.namespace != WEBDAV_NS],
+            )
         else:
-            responses = [
-                D.response(
+            responses = self.iter_propfind_responses(children, self.resource.ALL_PROPS, None)
+
+        if depth in self.xml_stream_depths:
+            return self.build_xml_stream_response(
+                '{%s}multistatus' % WEBDAV_NS, responses, StreamingHttpResponseMultiStatus
+            )
+        body = D.multistatus(*responses)
+        return self.build_xml_response(body, HttpResponseMultiStatus)
+
+    def get_dead_properties(self, resources, names=None):
+        """Return {clark name: element} dicts of dead properties of resources, all of them when names
+        is None."""
+        if self.property_store is None or names is not None and not names:
+            return [{} for _ in resources]
+        return self.property_store.get_properties(resources, names)
+
+    def iter_propfind_responses(self, children, names, dead_names=()):
+        """Yield multistatus response elements for children. Properties are computed by the resource
+        property registry and fetched from the property store per batch of propfind_batch_size
+        children, not per resource. Dead_names are clark names of requested dead properties, all the
+        stored ones are returned when it is None."""
+        registry = self.resource.property_registry
+        for batch in iter_batches(children, self.propfind_batch_size):
+            batch = self.filter_readable(batch)
+            rows = registry.get_property_tags(batch, names)
+            dead_rows = self.get_dead_properties(batch, dead_names)
+            for child, props, dead in zip(batch, rows, dead_rows):
+                found = sorted(dead) if dead_names is None else [name for name in dead_names if name in dead]
+                missing = [name for name in dead_names or () if name not in dead]
+                propstats = [D.propstat(
+                    D.prop(*(props + [dead[name] for name in found])),
+                    D.status('HTTP/1.1 200 OK'),
+                )]
+                if missing:
+                    propstats.append(D.propstat(
+                        D.prop(*[etree.Element(name) for name in missing]),
+                        D.status('HTTP/1.1 404 Not Found'),
+                    ))
+                yield D.response(D.href(url_join(self.base_url, child.get_escaped_path())), *propstats)
+
+    def iter_propname_responses(self, children):
+        for batch in iter_batches(children, self.propfind_batch_size):
+            batch = self.filter_readable(batch)
+            for child, dead in zip(batch, self.get_dead_properties(batch)):
+                yield D.response(
                     D.href(url_join(self.base_url, child.get_escaped_path())),
                     D.propstat(
-                        D.prop(
-                            *get_property_tag_list(child, *(get_prop if get_prop else child.ALL_PROPS))
-                        ),
+                        D.prop(*[D(name) for name in child.ALL_PROPS] +
+                               [etree.Element(name) for name in sorted(dead)]),
                         D.status('HTTP/1.1 200 OK'),
                     ),
                 )
-                for child in children
-            ]
-
-        body = D.multistatus(*responses)
-        return self.build_xml_response(body, HttpResponseMultiStatus)
 
     def proppatch(self, request, path, xbody, *args, **kwargs):
         if not self.resource.exists:
@@ -421,6 +688,8 @@ class DavView(View):
         depth = self.get_depth(default="0")
         if depth != 0:
             return HttpResponseBadRequest('Invalid depth header value %s' % depth)
+        if self.property_store is not None:
+            return self.update_properties(xbody)
         props = xbody('/D:propertyupdate/D:set/D:prop/*')
         body = D.multistatus(
             D.response(
@@ -433,6 +702,87 @@ class DavView(View):
         )
         return self.build_xml_response(body, HttpResponseMultiStatus)
 
+    def update_properties(self, xbody):
+        """Apply PROPPATCH set and remove instructions in document order as one property store
+        update. Live (DAV:) properties are protected, when one is in the request nothing is changed."""
+        updates, protected = [], []
+        for el in xbody('/D:propertyupdate/D:set/D:prop/* | /D:propertyupdate/D:remove/D:prop/*'):
+            if etree.QName(el).namespace == WEBDAV_NS:
+                protected.append(el.tag)
+            elif el.getparent().getparent().tag == '{%s}remove' % WEBDAV_NS:
+                updates.append((el.tag, None))
+            else:
+                updates.append((el.tag, el))
+        names = [name for name, _ in updates]
+        if protected:
+            propstats = [(protected, 'HTTP/1.1 403 Forbidden'), (names, 'HTTP/1.1 424 Failed Dependency')]
+        else:
+            self.property_store.set_properties(self.resource, updates)
+            propstats = [(names, 'HTTP/1.1 200 OK')]
+        body = D.multistatus(
+            D.response(
+                D.href(url_join(self.base_url, self.resource.get_escaped_path())),
+                *[D.propstat(
+                    D.prop(*[etree.Element(name) for name in names]),
+                    D.status(status),
+                ) for names, status in propstats if names]
+            )
+        )
+        return self.build_xml_response(body, HttpResponseMultiStatus)
+
+    def build_content_response(self, content, **kwargs):
+        """Build response for the value returned by resource read method. File objects and iterators
+        are streamed, file objects go through FileResponse so wsgi.file_wrapper (sendfile) can be used."""
+        if isinstance(content, (bytes, str)):
+            return HttpResponse(content, **kwargs)
+        if hasattr(content, 'read'):
+            if FileResponse is not None:
+                response = FileResponse(content, **kwargs)
+                response.block_size = self.stream_block_size
+                return response
+            content = iter_file(content, self.stream_block_size)
+        return StreamingHttpResponse(content, **kwargs)
+
+    def build_xml_stream_response(self, tag, elements, response_class=StreamingHttpResponse, **kwargs):
+        """Build streaming xml response. Elements are serialized one by one into the root element with
+        the given tag as the iterator yields them, so the document is never kept in memory as a whole
+        and the first bytes are sent while the rest is still being generated."""
+        def content():
+            buf = BytesIO()
+            with etree.xmlfile(buf, encoding=self.xml_encoding) as xf:
+                xf.write_declaration()
+                with xf.element(tag, nsmap=WEBDAV_NSMAP):
+                    for element in elements:
+                        xf.write(element, pretty_print=self.xml_pretty_print)
+                        if buf.tell() >= self.stream_block_size:
+                            xf.flush()
+                            yield buf.getvalue()
+                            buf.seek(0)
+                            buf.truncate()
+            yield buf.getvalue()
+
+        return response_class(
+            content(),
+            content_type='text/xml; charset="%s"' % self.xml_encoding,
+            **kwargs
+        )
+
+    def get_error_status(self, error):
+        """Return multistatus status line for an exception raised by a resource operation."""
+        if isinstance(error, EnvironmentError) and error.errno in (errno.EACCES, errno.EPERM):
+            return 'HTTP/1.1 403 Forbidden'
+        return 'HTTP/1.1 500 Internal Server Error'
+
+    def build_errors_response(self, errors):
+        """Build multistatus response for the (resource, exception) errors of a partially failed
+        DELETE, COPY or MOVE."""
+        return self.build_xml_response(D.multistatus(*[
+            D.response(
+                D.href(url_join(self.base_url, resource.get_escaped_path())),
+                D.status(self.get_error_status(error)),
+            ) for resource, error in errors
+        ]), response_class=HttpResponseMultiStatus)
+
     def build_xml_response(self, tree=None, response_class=HttpResponse, **kwargs):
         if tree is not None:
             content = etree.tostring(
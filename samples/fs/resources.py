@@ -1,8 +1,7 @@
 from __future__ import unicode_literals
 from django.conf import settings
-from djangodav.base.resources import MetaEtagMixIn
-from djangodav.fs.resources import DummyFSDAVResource
+from djangodav.fs.resources import DummyFSDAVResource, StatEtagMixIn
 
 
-class TempDirWebDavResource(MetaEtagMixIn, DummyFSDAVResource):
+class TempDirWebDavResource(StatEtagMixIn, DummyFSDAVResource):
     root = settings.WEBDAV_ROOT